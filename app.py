@@ -1,119 +1,217 @@
-from flask import Flask, request, jsonify
-from subprocess import run, PIPE, TimeoutExpired
+import time
+
+# Taken before the other imports so the startup report includes their cost
+STARTED = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
+from subprocess import run, PIPE
 import sys
 import json
+import logging
 import os
+import threading
 from flask_cors import CORS
 
+from engine import MentorEngine, RequestError, validate_request, validate_session_id
+from logconfig import configure_logging
+from metrics import metrics
+from startup import Warmup
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Define the Flask application
 app = Flask(__name__)
 CORS(app)
 
+# Limits for /respond/batch; clients may ask for less, never more
+BATCH_MAX_ITEMS = int(os.getenv('MENTOR_BATCH_MAX_ITEMS', '500'))
+BATCH_MAX_PARALLELISM = int(os.getenv('MENTOR_BATCH_MAX_PARALLELISM', '16'))
+BATCH_ITEM_TIMEOUT = float(os.getenv('MENTOR_BATCH_ITEM_TIMEOUT', '30'))
+
+# Build the mentor engine once so requests reuse the model client and characters
+try:
+    engine = MentorEngine.from_env()
+    engine_error = None
+except ValueError as e:
+    engine = None
+    engine_error = str(e)
+
+# Readiness: mentors built, model SDK imported and its channel open. Started
+# here unless MENTOR_WARMUP=post_fork, which gunicorn.conf.py sets so each
+# worker warms up after forking instead.
+warmup = Warmup.from_env(engine, started=STARTED, engine_error=engine_error)
+if os.getenv('MENTOR_WARMUP', 'import') == 'import':
+    warmup.start()
+
+# Set when a server worker is shutting down (see gunicorn.conf.py) so load balancers stop routing here
+draining = threading.Event()
+
 @app.route('/respond', methods=['POST'])
 def respond_to_user():
     """
-    Receives a user query and mentor option, and then executes a Python script
-    to generate a character-based response.
+    Receives a user query and mentor option, and then asks the resident
+    mentor engine for a character-based response.
     """
+    timer = metrics.request_timer()
+    status = 500
     try:
-        # Get data from the incoming JSON request
-        data = request.get_json()
-        
-        print(f"=== DEBUG: Received data: {data}")
-        
-        if not data:
-            print("ERROR: No JSON data provided")
-            return jsonify({"error": "No JSON data provided"}), 400
-            
-        question = data.get('question', '').strip()
-        mentor_option = data.get('mentor_option')
-
-        print(f"=== DEBUG: Extracted - Question: '{question}', Mentor Option: {mentor_option}")
-
-        # Validate that the necessary data is present
-        if not question:
-            print("ERROR: Missing or empty question")
-            return jsonify({"error": "Missing or empty 'question' in request body"}), 400
-            
-        if mentor_option is None:
-            print("ERROR: Missing mentor_option")
-            return jsonify({"error": "Missing 'mentor_option' in request body"}), 400
-            
-        # Validate mentor_option is a valid integer
-        try:
-            mentor_option = int(mentor_option)
-            if mentor_option not in [0, 1, 2]:
-                print(f"ERROR: Invalid mentor_option: {mentor_option}")
-                return jsonify({"error": "Invalid mentor_option. Must be 0, 1, or 2"}), 400
-        except (ValueError, TypeError):
-            print(f"ERROR: mentor_option not valid integer: {mentor_option}")
-            return jsonify({"error": "mentor_option must be a valid integer"}), 400
-
-        print(f"=== DEBUG: Validated inputs - Question: '{question}', Mentor Option: {mentor_option}")
-
-        # Check if gd_responder.py exists
-        script_path = "gd_responder.py"
-        if not os.path.exists(script_path):
-            print(f"ERROR: Script not found at {script_path}")
-            return jsonify({"error": f"Script file '{script_path}' not found"}), 500
-
-        print(f"=== DEBUG: Found script at {script_path}")
-
-        # Execute the gd_responder.py script as a subprocess
-        try:
-            print(f"=== DEBUG: Executing command: {sys.executable} {script_path} '{question}' {mentor_option}")
-            
-            process = run(
-                [sys.executable, script_path, question, str(mentor_option)],
-                stdout=PIPE,
-                stderr=PIPE,
-                text=True,
-                timeout=30
-            )
-            
-            print(f"=== DEBUG: Script completed with return code: {process.returncode}")
-            print(f"=== DEBUG: Script stdout: '{process.stdout}'")
-            print(f"=== DEBUG: Script stderr: '{process.stderr}'")
-
-        except TimeoutExpired:
-            print("ERROR: Script execution timed out")
-            return jsonify({"error": "Request timed out. The mentor is taking too long to respond."}), 508
-        except FileNotFoundError as e:
-            print(f"ERROR: FileNotFoundError: {e}")
-            return jsonify({"error": f"Could not execute script: {e}"}), 500
-
-        # Check for errors from the subprocess
-        if process.returncode != 0:
-            error_msg = process.stderr if process.stderr else "Unknown error occurred in gd_responder.py"
-            print(f"ERROR: Script failed with error: {error_msg}")
-            return jsonify({"error": f"Script execution failed: {error_msg}"}), 500
-
-        response_text = process.stdout.strip()
-        print(f"=== DEBUG: Final response text: '{response_text}'")
-        
+        with timer.stage('validation'):
+            # Get data from the incoming JSON request
+            data = request.get_json()
+            logger.debug("Received data: %s", data)
+
+            try:
+                question, mentor_option = validate_request(data)
+                session_id = validate_session_id(data)
+            except RequestError as e:
+                logger.info("Rejected /respond request: %s", e)
+                status = 400
+                return jsonify({"error": str(e)}), 400
+
+        if engine is None:
+            logger.error("Mentor engine unavailable: %s", engine_error)
+            return jsonify({"error": f"Mentor engine unavailable: {engine_error}"}), 500
+
+        response_text = engine.respond(question, mentor_option, session_id=session_id, timer=timer).strip()
+        logger.debug("Final response text: %r", response_text)
+
         if not response_text:
-            print("ERROR: Empty response from script")
-            return jsonify({"error": "Empty response from mentor script"}), 500
+            logger.error("Empty response from mentor engine")
+            return jsonify({"error": "Empty response from mentor engine"}), 500
 
-        # Return the output from the script
-        print(f"=== DEBUG: Returning successful response")
-        return jsonify({"response": response_text})
+        with timer.stage('serialization'):
+            payload = {"response": response_text}
+            if session_id is not None:
+                payload["session_id"] = session_id
+            body = jsonify(payload)
+        status = 200
+        return body
 
     except Exception as e:
-        print(f"=== ERROR: Unexpected exception: {str(e)}")
-        print(f"=== ERROR: Exception type: {type(e).__name__}")
-        import traceback
-        print(f"=== ERROR: Traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in /respond")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+    finally:
+        timer.finish(endpoint='/respond', status=status)
+        metrics.increment('mentor_requests_total', endpoint='/respond', status=status)
+
+@app.route('/respond/stream', methods=['POST'])
+def stream_response_to_user():
+    """
+    Same request body as /respond, but streams the mentor's reply as
+    Server-Sent Events: one `data: {"text": ...}` event per chunk, then a
+    final `done` event.
+    """
+    data = request.get_json(silent=True)
+    try:
+        question, mentor_option = validate_request(data)
+    except RequestError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if engine is None:
+        return jsonify({"error": f"Mentor engine unavailable: {engine_error}"}), 500
+
+    def events():
+        started = time.perf_counter()
+        first_chunk = True
+        for chunk in engine.stream(question, mentor_option):
+            if chunk:
+                if first_chunk:
+                    metrics.observe('mentor_stream_first_chunk_seconds', time.perf_counter() - started)
+                    first_chunk = False
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+        metrics.observe('mentor_request_seconds', time.perf_counter() - started,
+                        endpoint='/respond/stream', mentor=engine.get_character(mentor_option).name)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/respond/batch', methods=['POST'])
+def respond_batch():
+    """
+    Answers a list of {question, mentor_option} items in one call.
+
+    Optional `max_parallelism` and `item_timeout` (seconds) are capped by
+    MENTOR_BATCH_MAX_PARALLELISM and MENTOR_BATCH_ITEM_TIMEOUT. Results are
+    returned in request order with per-item errors.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Missing or empty 'items' list in request body"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items. At most {BATCH_MAX_ITEMS} per batch"}), 400
+
+    try:
+        max_parallelism = int(data.get('max_parallelism', BATCH_MAX_PARALLELISM))
+        item_timeout = float(data.get('item_timeout', BATCH_ITEM_TIMEOUT))
+    except (ValueError, TypeError):
+        return jsonify({"error": "max_parallelism and item_timeout must be numbers"}), 400
+    if max_parallelism < 1 or item_timeout <= 0:
+        return jsonify({"error": "max_parallelism and item_timeout must be positive"}), 400
+
+    if engine is None:
+        return jsonify({"error": f"Mentor engine unavailable: {engine_error}"}), 500
+
+    results = engine.respond_batch(
+        items,
+        max_parallelism=min(max_parallelism, BATCH_MAX_PARALLELISM),
+        item_timeout=min(item_timeout, BATCH_ITEM_TIMEOUT),
+    )
+    return jsonify({"results": results})
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
-    return jsonify({"status": "healthy", "message": "Mentor API is running"}), 200
+    if draining.is_set():
+        return jsonify({"status": "draining", "message": "Mentor API is shutting down"}), 503
+    if engine is None:
+        return jsonify({"status": "unhealthy", "message": f"Mentor engine unavailable: {engine_error}"}), 503
+    return jsonify({"status": "healthy", "message": "Mentor API is running", "ready": warmup.ready}), 200
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving HTTP"""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 200 once warm-up has finished, 503 before that and while draining"""
+    if draining.is_set():
+        return jsonify({"status": "draining", "ready": False}), 503
+    return jsonify(warmup.stats()), 200 if warmup.ready else 503
+
+@app.route('/startup', methods=['GET'])
+def startup_report():
+    """How long this process took to become ready, by phase"""
+    return jsonify(warmup.stats()), 200
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report response cache and request coalescing counters"""
+    if engine is None:
+        return jsonify({"cache": None, "coalescing": None}), 200
+    return jsonify(engine.stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Per-stage and per-request latency histograms, labelled by mentor and
+    conversation_type. Prometheus text by default, JSON with ?format=json.
+    """
+    if request.args.get('format') == 'json':
+        snapshot = metrics.snapshot()
+        snapshot["engine"] = engine.stats() if engine is not None else None
+        return jsonify(snapshot), 200
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/test-script', methods=['GET'])
 def test_script():
-    """Test if gd_responder.py can be executed"""
+    """Test if gd_responder.py can be executed, answering from the fake backend instead of the API"""
     try:
         # Test with simple parameters
         process = run(
@@ -121,7 +219,8 @@ def test_script():
             stdout=PIPE,
             stderr=PIPE,
             text=True,
-            timeout=10
+            timeout=10,
+            env={**os.environ, "MENTOR_BACKEND": "fake"},
         )
         
         return jsonify({
@@ -138,9 +237,18 @@ if __name__ == '__main__':
     print("Starting Mentor Backend API...")
     print("Available endpoints:")
     print("- POST /respond - Get mentor response")
+    print("- POST /respond/batch - Answer many questions in one call")
+    print("- POST /respond/stream - Stream mentor response (Server-Sent Events)")
     print("- GET /health - Health check")
-    print("- GET /test-script - Test gd_responder.py")
+    print("- GET /health/live - Liveness probe")
+    print("- GET /health/ready - Readiness probe (503 until warm-up finishes)")
+    print("- GET /startup - Startup time by phase")
+    print("- GET /metrics - Latency histograms (Prometheus text, or ?format=json)")
+    print("- GET /cache/stats - Response cache and coalescing statistics")
+    print("- GET /test-script - Test gd_responder.py (fake backend, no API call)")
     print(f"Python executable: {sys.executable}")
     print(f"Working directory: {os.getcwd()}")
     print(f"gd_responder.py exists: {os.path.exists('gd_responder.py')}")
+    print(f"Mentor engine ready: {engine is not None}")
+    print("Development server only; in production run: gunicorn -c gunicorn.conf.py app:app")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Asyncio serving mode for the mentor API.
+
+Run with any ASGI server, for example:
+
+    uvicorn asgi_app:app --workers 1
+
+or under gunicorn with the preload and per-worker setup in gunicorn.conf.py:
+
+    MENTOR_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi_app:app
+
+Each request awaits the model instead of holding an OS thread, and a
+ConcurrencyLimiter caps in-flight generations; requests beyond the queue
+are rejected with 503 and a Retry-After header.
+"""
+import time
+
+# Taken before the other imports so the startup report includes their cost
+STARTED = time.perf_counter()
+
+import asyncio
+import json
+import os
+import signal
+import threading
+
+from concurrency import ConcurrencyLimiter, OverloadedError
+from engine import MentorEngine, RequestError, validate_request
+from logconfig import configure_logging
+from metrics import metrics
+from startup import Warmup
+
+configure_logging()
+
+REQUEST_TIMEOUT = float(os.getenv('MENTOR_REQUEST_TIMEOUT', '30'))
+
+# Build the mentor engine once so requests reuse the model client and characters
+try:
+    engine = MentorEngine.from_env()
+    engine_error = None
+except ValueError as e:
+    engine = None
+    engine_error = str(e)
+
+limiter = ConcurrencyLimiter.from_env()
+
+# Set when SIGTERM arrives so /health and /health/ready report draining
+draining = threading.Event()
+
+# See app.py; readiness is reported on /health/ready
+warmup = Warmup.from_env(engine, started=STARTED, engine_error=engine_error)
+if os.getenv('MENTOR_WARMUP', 'import') == 'import':
+    warmup.start()
+
+
+async def read_body(receive):
+    """Collect the full request body from the ASGI receive channel"""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def respond_to_user(receive, send):
+    """Async counterpart of the Flask /respond endpoint"""
+    try:
+        data = json.loads(await read_body(receive) or b"null")
+    except ValueError:
+        return await send_json(send, 400, {"error": "Request body must be valid JSON"})
+
+    try:
+        question, mentor_option = validate_request(data, engine.mentors.options() if engine else None)
+    except RequestError as e:
+        return await send_json(send, 400, {"error": str(e)})
+
+    if engine is None:
+        return await send_json(send, 500, {"error": f"Mentor engine unavailable: {engine_error}"})
+
+    timer = metrics.request_timer()
+    status = 500
+    try:
+        try:
+            async with limiter:
+                response_text = await asyncio.wait_for(
+                    engine.respond_async(question, mentor_option, timer=timer), timeout=REQUEST_TIMEOUT
+                )
+        except OverloadedError as e:
+            status = 503
+            return await send_json(
+                send, 503, {"error": str(e)},
+                headers=[(b"retry-after", str(e.retry_after).encode())],
+            )
+        except asyncio.TimeoutError:
+            status = 508
+            return await send_json(send, 508, {"error": "Request timed out. The mentor is taking too long to respond."})
+
+        response_text = response_text.strip()
+        if not response_text:
+            return await send_json(send, 500, {"error": "Empty response from mentor engine"})
+        status = 200
+        with timer.stage('serialization'):
+            return await send_json(send, 200, {"response": response_text})
+    finally:
+        timer.finish(endpoint='/respond', status=status)
+        metrics.increment('mentor_requests_total', endpoint='/respond', status=status)
+
+
+def watch_for_shutdown():
+    """
+    Chain onto the server's SIGTERM handler to set `draining`.
+
+    Called at lifespan startup because uvicorn, also as gunicorn's
+    UvicornWorker, installs its own handler when it starts serving and
+    would replace one set any earlier.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def drain(sig, frame):
+        draining.set()
+        if callable(previous):
+            previous(sig, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(sig, signal.SIG_DFL)
+            os.kill(os.getpid(), sig)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            watch_for_shutdown()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS":
+        await send({
+            "type": "http.response.start",
+            "status": 204,
+            "headers": [
+                (b"access-control-allow-origin", b"*"),
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"content-type"),
+            ],
+        })
+        return await send({"type": "http.response.body", "body": b""})
+
+    if path == "/respond" and method == "POST":
+        return await respond_to_user(receive, send)
+    if path == "/health" and method == "GET":
+        if draining.is_set():
+            return await send_json(send, 503, {"status": "draining", "message": "Mentor API is shutting down"})
+        if engine is None:
+            return await send_json(send, 503, {
+                "status": "unhealthy",
+                "message": f"Mentor engine unavailable: {engine_error}",
+            })
+        return await send_json(send, 200, {
+            "status": "healthy",
+            "message": "Mentor API is running",
+            "ready": warmup.ready,
+            "concurrency": limiter.stats(),
+        })
+    if path == "/health/live" and method == "GET":
+        return await send_json(send, 200, {"status": "alive"})
+    if path == "/health/ready" and method == "GET":
+        if draining.is_set():
+            return await send_json(send, 503, {"status": "draining", "ready": False})
+        return await send_json(send, 200 if warmup.ready else 503, warmup.stats())
+    if path == "/startup" and method == "GET":
+        return await send_json(send, 200, warmup.stats())
+    if path == "/metrics" and method == "GET":
+        body = metrics.render_prometheus().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain; version=0.0.4")],
+        })
+        return await send({"type": "http.response.body", "body": body})
+    return await send_json(send, 404, {"error": "Not found"})
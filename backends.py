@@ -0,0 +1,354 @@
+"""
+Model backends behind GeminiResponder.
+
+A backend turns a prompt into a google.generativeai-style response object
+(candidates[0].finish_reason and .text). GeminiBackend talks to the real
+API; FakeBackend answers in-process with configurable latency, finish
+reasons and error rates, for load tests and offline benchmarks.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+# google.generativeai FinishReason values
+FINISH_REASONS = {"STOP": 1, "MAX_TOKENS": 2, "SAFETY": 3, "RECITATION": 4, "OTHER": 5}
+
+
+class GeminiBackend:
+    def __init__(self, api_key, model_name, generation_config, safety_settings, dedicated_client=False):
+        """
+        Backend for the Gemini API.
+
+        With dedicated_client=True the key is bound to this backend's own gRPC
+        clients instead of the process-wide genai.configure, so several
+        backends can use different keys side by side.
+        """
+        self.api_key = api_key
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self.dedicated_client = dedicated_client
+        self._genai = None
+        self._clients = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @property
+    def genai(self):
+        """google.generativeai, imported on first use; it takes most of a cold start"""
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+
+                    if not self.dedicated_client:
+                        genai.configure(api_key=self.api_key)
+                    self._genai = genai
+        return self._genai
+
+    def model_for(self, system_instruction=None):
+        """The GenerativeModel to call, built once per system_instruction"""
+        model = self._models.get(system_instruction)
+        if model is None:
+            model = self.genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings,
+                system_instruction=system_instruction
+            )
+            if self.dedicated_client:
+                model._client, model._async_client = self._dedicated_clients()
+            self._models[system_instruction] = model
+        return model
+
+    def warm_up(self, system_instructions=(), connect=True, timeout=10.0):
+        """
+        Import the SDK, build the models and open the gRPC channel.
+
+        One count_tokens call goes over the same channel as generation, so
+        the TLS handshake is paid here rather than by the first user. With
+        connect=False only the imports run, which is safe before a fork.
+        Returns the seconds spent on each step.
+        """
+        timings = {}
+        started = time.perf_counter()
+        import grpc  # noqa: F401  (timed apart from the SDK itself)
+        timings["grpc_import"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.genai
+        timings["sdk_import"] = time.perf_counter() - started
+        if not connect:
+            return timings
+
+        started = time.perf_counter()
+        for system_instruction in (None, *system_instructions):
+            model = self.model_for(system_instruction)
+        timings["models"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        # No SDK retries; the caller decides whether to try again
+        model.count_tokens("warm up", request_options=self._options(timeout))
+        timings["connect"] = time.perf_counter() - started
+        return timings
+
+    def _dedicated_clients(self):
+        if self._clients is None:
+            from google.ai import generativelanguage as glm
+
+            options = {"api_key": self.api_key}
+            self._clients = (
+                glm.GenerativeServiceClient(client_options=options),
+                glm.GenerativeServiceAsyncClient(client_options=options),
+            )
+        return self._clients
+
+    def after_fork(self):
+        """
+        Forget models and gRPC channels created before a fork.
+
+        gRPC channels cannot be used from a forked child, so a worker builds
+        its own on first use.
+        """
+        self._models = {}
+        self._clients = None
+        if self._genai is not None and not self.dedicated_client:
+            # Also resets the clients cached by genai's global client manager
+            self._genai.configure(api_key=self.api_key)
+
+    @staticmethod
+    def _options(timeout):
+        # No SDK retries: its default retries a 503 for up to 600s, resetting a
+        # spent timeout, so no deadline would hold. ResilientClient retries.
+        options = {"retry": None}
+        if timeout:
+            options["timeout"] = timeout
+        return options
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, stream=False):
+        return self.model_for(system_instruction).generate_content(
+            prompt, generation_config=generation_config, stream=stream, request_options=self._options(timeout)
+        )
+
+    async def generate_async(self, prompt, system_instruction=None, generation_config=None, timeout=None):
+        return await self.model_for(system_instruction).generate_content_async(
+            prompt, generation_config=generation_config, request_options=self._options(timeout)
+        )
+
+    def chat(self, history, prompt, system_instruction=None, generation_config=None, timeout=None):
+        # A fresh chat per call, so a failed try never leaves half a turn in the history
+        chat = self.model_for(system_instruction).start_chat(history=history)
+        return chat.send_message(prompt, generation_config=generation_config, request_options=self._options(timeout))
+
+
+class LatencyDistribution:
+    def __init__(self, kind="constant", a=0.0, b=0.0, rng=None):
+        """
+        Sampled response latency in seconds.
+
+        constant:a, uniform:a,b, exponential:mean, lognormal:median,sigma
+        """
+        if kind not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.a = a
+        self.b = b
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec, rng=None):
+        """Parse a spec such as 'lognormal:0.8,0.5' or '0.2' (constant)"""
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "constant", kind
+        values = [float(v) for v in args.split(",") if v.strip()] + [0.0, 0.0]
+        return cls(kind.strip(), values[0], values[1], rng)
+
+    def sample(self):
+        if self.kind == "constant":
+            return self.a
+        if self.kind == "uniform":
+            return self.rng.uniform(self.a, self.b)
+        if self.kind == "exponential":
+            return self.rng.expovariate(1.0 / self.a) if self.a else 0.0
+        return self.rng.lognormvariate(0.0, self.b) * self.a
+
+
+class FakeUpstreamError(Exception):
+    """Injected upstream failure; .code mimics the HTTP status of google.api_core errors"""
+
+    def __init__(self, code=503):
+        super().__init__(f"{code} Injected upstream error")
+        self.code = code
+
+
+class _Candidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class FakeResponse:
+    def __init__(self, text, finish_reason=1):
+        self._text = text
+        self.candidates = [_Candidate(finish_reason)]
+
+    @property
+    def text(self):
+        # Same failure mode as the real SDK when a response has no parts
+        if not self._text:
+            raise ValueError(
+                "Invalid operation: The `response.text` quick accessor requires the response to "
+                f"contain a valid `Part`, but none were returned. The candidate's finish_reason is "
+                f"{self.candidates[0].finish_reason}."
+            )
+        return self._text
+
+
+DEFAULT_FAKE_REPLY = (
+    "Walk the path before you with patience — every step taught is a step learned. "
+    "Consider the river: it does not fight the stone, yet in time it shapes it… "
+    "Begin with one small discipline today, and let it grow into strength."
+)
+
+
+class FakeBackend:
+    def __init__(self, latency=None, finish_reasons=None, error_rate=0.0, error_code=503,
+                 reply=DEFAULT_FAKE_REPLY, stream_chunks=4, seed=None):
+        """
+        In-process stand-in for the Gemini API.
+
+        Every call sleeps for a sample of `latency`, then fails with
+        FakeUpstreamError(error_code) with probability error_rate, or finishes
+        with one of finish_reasons ({"SAFETY": 0.02, ...} probabilities) and
+        otherwise returns `reply` with STOP. reply may be a callable taking
+        the prompt.
+        """
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.latency = latency or LatencyDistribution(rng=self.rng)
+        self.finish_reasons = {FINISH_REASONS[k]: p for k, p in (finish_reasons or {}).items()}
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.reply = reply
+        self.stream_chunks = max(1, stream_chunks)
+        self.model_name = "fake"
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a fake from MENTOR_FAKE_LATENCY (e.g. 'lognormal:0.8,0.5'),
+        MENTOR_FAKE_FINISH_REASONS (e.g. 'SAFETY=0.02,MAX_TOKENS=0.05'),
+        MENTOR_FAKE_ERROR_RATE, MENTOR_FAKE_ERROR_CODE and MENTOR_FAKE_SEED.
+        """
+        seed = os.getenv('MENTOR_FAKE_SEED')
+        finish_reasons = {}
+        for item in os.getenv('MENTOR_FAKE_FINISH_REASONS', '').split(','):
+            if '=' in item:
+                name, probability = item.split('=', 1)
+                finish_reasons[name.strip().upper()] = float(probability)
+        backend = cls(
+            finish_reasons=finish_reasons,
+            error_rate=float(os.getenv('MENTOR_FAKE_ERROR_RATE', '0')),
+            error_code=int(os.getenv('MENTOR_FAKE_ERROR_CODE', '503')),
+            seed=int(seed) if seed else None,
+        )
+        backend.latency = LatencyDistribution.parse(os.getenv('MENTOR_FAKE_LATENCY', '0'), backend.rng)
+        return backend
+
+    def _outcome(self, prompt, generation_config=None):
+        """Decide the latency, error and finish reason for one call"""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency.sample())
+            if self.rng.random() < self.error_rate:
+                return delay, FakeUpstreamError(self.error_code), None, None
+            roll = self.rng.random()
+            finish_reason = 1
+            for reason, probability in self.finish_reasons.items():
+                if roll < probability:
+                    finish_reason = reason
+                    break
+                roll -= probability
+
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        # Roughly four characters per token, as for the real model
+        limit = (generation_config or {}).get('max_output_tokens')
+        if finish_reason == 2:
+            text = text[:len(text) // 2]
+        elif finish_reason in (3, 4):
+            text = ""
+        elif limit is not None and len(text) > limit * 4:
+            text, finish_reason = text[:limit * 4], 2
+        return delay, None, text, finish_reason
+
+    def generate(self, prompt, system_instruction=None, generation_config=None, timeout=None, stream=False):
+        delay, error, text, finish_reason = self._outcome(prompt, generation_config)
+        if stream:
+            return self._stream(delay, error, text, finish_reason, timeout)
+        self._sleep(delay, timeout)
+        if error is not None:
+            raise error
+        return FakeResponse(text, finish_reason)
+
+    def _stream(self, delay, error, text, finish_reason, timeout):
+        # Time to first chunk is half the latency; the rest is spread over the chunks
+        self._sleep(delay / 2, timeout)
+        if error is not None:
+            raise error
+        size = max(1, -(-len(text) // self.stream_chunks)) if text else 1
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay / 2 / len(pieces))
+            last = index == len(pieces) - 1
+            yield FakeResponse(piece, finish_reason if last else 0)
+
+    async def generate_async(self, prompt, system_instruction=None, generation_config=None, timeout=None):
+        delay, error, text, finish_reason = self._outcome(prompt, generation_config)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError("Fake model call timed out")
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return FakeResponse(text, finish_reason)
+
+    def chat(self, history, prompt, system_instruction=None, generation_config=None, timeout=None):
+        return self.generate(prompt, system_instruction, generation_config, timeout)
+
+    def warm_up(self, system_instructions=(), connect=True, timeout=None):
+        # Nothing to import or connect
+        return {}
+
+    def after_fork(self):
+        # Workers would otherwise draw the same "random" outcomes and latencies.
+        # With a seed each worker still gets a reproducible stream of its own.
+        seed = None if self.seed is None else f"{self.seed}:{os.getpid()}"
+        self.rng.seed(seed)
+        if self.latency.rng is not self.rng:
+            self.latency.rng.seed(seed)
+
+    @staticmethod
+    def _sleep(delay, timeout):
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Fake model call timed out")
+        time.sleep(delay)
+
+    def stats(self):
+        return {"calls": self.calls}
+
+
+def build_backend_from_env(api_key, model_name, generation_config, safety_settings, dedicated_client=False):
+    """The backend chosen by MENTOR_BACKEND: 'gemini' (default) or 'fake'"""
+    if os.getenv('MENTOR_BACKEND', 'gemini').lower() == 'fake':
+        backend = FakeBackend.from_env()
+        backend.model_name = model_name
+        return backend
+    if not api_key:
+        raise ValueError("API key is required")
+    return GeminiBackend(api_key, model_name, generation_config, safety_settings, dedicated_client)
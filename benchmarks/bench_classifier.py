@@ -0,0 +1,66 @@
+"""
+Correctness check and micro-benchmark for detect_conversation_type.
+
+Compares the compiled classifier against the original substring scan on the
+corpus in classifier_corpus.json:
+
+    python benchmarks/bench_classifier.py [--iterations N]
+
+Exits non-zero if the compiled classifier misclassifies any corpus entry.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier import FAREWELL_PATTERNS, GREETING_PATTERNS, default_classifier
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classifier_corpus.json')
+
+
+def substring_classify(question):
+    """The original implementation, kept here as the baseline"""
+    question_lower = question.lower().strip()
+    for pattern in FAREWELL_PATTERNS:
+        if pattern in question_lower:
+            return 'farewell'
+    for pattern in GREETING_PATTERNS:
+        if pattern in question_lower:
+            return 'greeting'
+    return 'question'
+
+
+def check(classify, corpus):
+    return [(q, expected, classify(q)) for q, expected in corpus if classify(q) != expected]
+
+
+def bench(classify, questions, iterations):
+    seconds = timeit.timeit(lambda: [classify(q) for q in questions], number=iterations)
+    return seconds / (iterations * len(questions)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    questions = [q for q, _ in corpus]
+
+    for name, classify in (("substring", substring_classify), ("compiled", default_classifier.classify)):
+        errors = check(classify, corpus)
+        per_call = bench(classify, questions, args.iterations)
+        print(f"{name:>10}: {per_call:.2f} us/question, {len(errors)}/{len(corpus)} misclassified")
+        for question, expected, got in errors:
+            print(f"            {question!r}: expected {expected}, got {got}")
+
+    if check(default_classifier.classify, corpus):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark clean_unicode_text against the original per-mapping str.replace loop
+and a single-pass str.translate table.
+
+    python benchmarks/bench_clean_text.py [--length CHARS] [--iterations N]
+
+Both implementations are run on a long synthetic mentor response with the
+usual mix of smart quotes, dashes and macrons, and on the same response
+split into stream-sized chunks.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalize import REPLACEMENTS, clean_unicode_text
+
+SAMPLE = (
+    "Musashi’s “Dokkōdō” teaches acceptance — walk alone, "
+    "yet never lonely… The way of the sword is the way of the mind; Bushidō asks "
+    "for discipline, not perfection. Practice daily and the path reveals itself. "
+)
+
+
+def replace_loop(text):
+    """The original implementation: one full str.replace pass per mapping"""
+    if not text:
+        return text
+    for old, new in REPLACEMENTS.items():
+        text = text.replace(old, new)
+    return text
+
+
+TRANSLATION_TABLE = str.maketrans(REPLACEMENTS)
+
+
+def translate(text):
+    """Single pass with a precompiled str.translate table"""
+    return text.translate(TRANSLATION_TABLE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--length', type=int, default=20000, help="response length in characters")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--chunk', type=int, default=64, help="stream chunk size in characters")
+    args = parser.parse_args()
+
+    text = (SAMPLE * (args.length // len(SAMPLE) + 1))[:args.length]
+    ascii_text = clean_unicode_text(text)
+    chunks = [text[i:i + args.chunk] for i in range(0, len(text), args.chunk)]
+    assert clean_unicode_text(text) == replace_loop(text) == translate(text)
+
+    cases = [
+        ("replace loop", lambda: replace_loop(text)),
+        ("translate table", lambda: translate(text)),
+        ("clean_unicode_text", lambda: clean_unicode_text(text)),
+        ("  with fold", lambda: clean_unicode_text(text, fold=True)),
+        ("  on ASCII text", lambda: clean_unicode_text(ascii_text)),
+        ("replace loop/chunks", lambda: [replace_loop(c) for c in chunks]),
+        ("translate/chunks", lambda: [translate(c) for c in chunks]),
+        ("clean/chunks", lambda: [clean_unicode_text(c) for c in chunks]),
+    ]
+    print(f"{len(text)} characters, {len(chunks)} chunks of {args.chunk}")
+    for name, fn in cases:
+        seconds = timeit.timeit(fn, number=args.iterations) / args.iterations
+        print(f"{name:<20}: {seconds * 1e6:9.1f} us")
+
+
+if __name__ == '__main__':
+    main()
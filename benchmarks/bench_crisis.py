@@ -0,0 +1,57 @@
+"""
+Correctness check and latency benchmark for the crisis fast path.
+
+Runs detect_crisis over the labelled questions in crisis_corpus.json and
+times it next to detect_conversation_type, which already sits on the hot
+path:
+
+    python benchmarks/bench_crisis.py [--iterations N]
+
+The corpus holds full sentences as people write them, not copies of the
+phrases in CRISIS_PATTERNS, including everyday sentences that contain a
+crisis phrase ("I hurt myself at the gym"). Add every phrasing found to
+be missed or wrongly flagged. Exits non-zero if any entry is
+misclassified.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import detect_conversation_type, detect_crisis
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crisis_corpus.json')
+
+
+def bench(fn, questions, iterations):
+    """Mean microseconds per question"""
+    seconds = timeit.timeit(lambda: [fn(q) for q in questions], number=iterations)
+    return seconds / (iterations * len(questions)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    questions = [q for q, _ in corpus]
+
+    errors = [(q, expected) for q, expected in corpus if detect_crisis(q) != expected]
+    crisis = bench(detect_crisis, questions, args.iterations)
+    conversation = bench(detect_conversation_type, questions, args.iterations)
+    print(f"detect_crisis:            {crisis:.2f} us/question, {len(errors)}/{len(corpus)} misclassified")
+    print(f"detect_conversation_type: {conversation:.2f} us/question")
+    for question, expected in errors:
+        print(f"    {question!r}: expected {'crisis' if expected else 'no crisis'}")
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Regression check that a model call fails fast when the upstream is down.
+
+Points GeminiBackend at a closed local port and times one generate call
+with a short timeout. The SDK's own retry would keep a call like this
+going for minutes, long past the ResilientClient deadline:
+
+    python benchmarks/check_upstream_deadline.py [--timeout SECONDS] [--port PORT]
+
+Exits non-zero if the call is still running after twice the timeout or
+does not fail with a retryable error.
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import GeminiBackend
+from model import is_retryable
+
+
+def closed_port():
+    """A local port nothing listens on"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=3.0)
+    parser.add_argument('--port', type=int, default=None)
+    args = parser.parse_args()
+
+    backend = GeminiBackend('check-key', 'gemini-1.5-flash', None, None)
+    endpoint = f"127.0.0.1:{args.port or closed_port()}"
+    backend.genai.configure(api_key='check-key', client_options={"api_endpoint": endpoint})
+
+    outcome = {}
+
+    def call():
+        try:
+            backend.generate("ping", timeout=args.timeout)
+        except Exception as e:
+            outcome["error"] = e
+
+    started = time.perf_counter()
+    # A daemon thread, so a call that keeps retrying cannot hang the check
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(2 * args.timeout)
+    elapsed = time.perf_counter() - started
+
+    if thread.is_alive():
+        print(f"FAIL: generate against {endpoint} still running after {elapsed:.1f}s "
+              f"(timeout {args.timeout}s)")
+        sys.exit(1)
+    error = outcome.get("error")
+    print(f"generate against {endpoint}: {elapsed:.2f}s, {type(error).__name__}: {error}")
+    if error is None or not is_retryable(error):
+        print("FAIL: expected a retryable upstream error")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Replay recorded traffic against /respond and report latency and throughput.
+
+    python benchmarks/loadtest.py [--target inprocess|http|subprocess]
+                                  [--traffic FILE] [--requests N]
+                                  [--rate RPS] [--concurrency N]
+                                  [--url URL] [--output FILE] [--baseline FILE]
+
+Traffic is JSONL: one {"question": ..., "mentor_option": ...} per line.
+Lines without a question (such as the backlog entries in requests.jsonl)
+use their title and body as the question and cycle through the mentors.
+The default is requests.jsonl at the repo root when present, otherwise
+traffic_sample.jsonl next to this script.
+
+Targets:
+  inprocess   Flask's test client against app.py, no network
+  http        a running server at --url (app.py, gunicorn or asgi_app)
+  subprocess  one gd_responder.py process per request, the original path
+
+Unless --real-backend is given the fake model backend is used
+(MENTOR_BACKEND=fake), tuned with the MENTOR_FAKE_* variables, so runs are
+free and repeatable. Requests are sent open-loop at --rate per second (0
+sends as fast as --concurrency allows). With a rate, latency is measured
+from when each request was due, so time spent queued behind --concurrency
+counts (no coordinated omission). The report, with throughput,
+p50/p95/p99 latency, error and fallback rates and upstream call counts,
+is printed and saved as JSON under benchmarks/results/ so runs can be
+compared across versions with --baseline.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'results')
+
+
+def default_traffic_path():
+    path = os.path.join(ROOT, 'requests.jsonl')
+    return path if os.path.exists(path) else os.path.join(HERE, 'traffic_sample.jsonl')
+
+
+def load_traffic(path, mentor_count=3):
+    """Read (question, mentor_option) pairs from a JSONL capture"""
+    items = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = record.get('question')
+            if question is None:
+                question = " ".join(str(record[k]) for k in ('title', 'body') if record.get(k))
+            option = record.get('mentor_option', len(items) % mentor_count)
+            items.append((question, option))
+    if not items:
+        raise SystemExit(f"No traffic in {path}")
+    return items
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def upstream_calls(model):
+    """Calls made by the model backend(s) of an engine, when they count them"""
+    members = getattr(model, 'members', None)
+    responders = [m.responder for m in members] if members else [model]
+    total = 0
+    for responder in responders:
+        backend = getattr(responder, 'backend', None)
+        if backend is None or not hasattr(backend, 'stats'):
+            return None
+        total += backend.stats().get('calls', 0)
+    return total
+
+
+class InProcessTarget:
+    name = 'inprocess'
+
+    def __init__(self, args):
+        import app
+
+        if app.engine is None:
+            raise SystemExit(f"Mentor engine unavailable: {app.engine_error}")
+        self.app = app
+        # The test client is not thread-safe; give each worker its own
+        self._local = threading.local()
+
+    def send(self, question, option):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.app.test_client()
+        response = client.post('/respond', json={"question": question, "mentor_option": option})
+        body = response.get_json(silent=True) or {}
+        return response.status_code, body.get('response')
+
+    def upstream_calls(self):
+        return upstream_calls(self.app.engine.model)
+
+
+class HttpTarget:
+    name = 'http'
+
+    def __init__(self, args):
+        self.url = args.url.rstrip('/')
+        self.timeout = args.timeout
+
+    def send(self, question, option):
+        data = json.dumps({"question": question, "mentor_option": option}).encode('utf-8')
+        request = urllib.request.Request(
+            self.url + '/respond', data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read()).get('response')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def upstream_calls(self):
+        # Only available when the server exposes its engine stats (app.py does)
+        try:
+            with urllib.request.urlopen(self.url + '/cache/stats', timeout=self.timeout) as response:
+                upstream = json.loads(response.read()).get('upstream') or {}
+        except (urllib.error.URLError, ValueError):
+            return None
+        return (upstream.get('backend') or {}).get('calls')
+
+
+class SubprocessTarget:
+    name = 'subprocess'
+
+    def __init__(self, args):
+        self.timeout = args.timeout
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send(self, question, option):
+        # Each process builds its own engine and cache, so every request reaches the model
+        with self._lock:
+            self.calls += 1
+        try:
+            process = subprocess.run(
+                [sys.executable, os.path.join(ROOT, 'gd_responder.py'), question, str(option)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                timeout=self.timeout, cwd=ROOT,
+            )
+        except subprocess.TimeoutExpired:
+            return 508, None
+        return (200 if process.returncode == 0 else 500), process.stdout.strip()
+
+    def upstream_calls(self):
+        # Retries inside the child processes are not visible here
+        return self.calls
+
+
+TARGETS = {t.name: t for t in (InProcessTarget, HttpTarget, SubprocessTarget)}
+
+
+def run(target, items, requests, rate, concurrency):
+    """Send `requests` requests cycling through items; returns per-request results"""
+    from model import FALLBACK_RESPONSES
+
+    results = [None] * requests
+
+    def one(index, scheduled):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        question, option = items[index % len(items)]
+        started = time.perf_counter()
+        try:
+            status, text = target.send(question, option)
+        except Exception as e:
+            status, text = type(e).__name__, None
+        finished = time.perf_counter()
+        results[index] = {
+            "status": status,
+            # Open loop: from when the request was due, as its user would see it
+            "latency": finished - (scheduled if rate else started),
+            "service": finished - started,
+            # How far behind schedule the request went out (client saturation)
+            "lag": max(0.0, started - scheduled),
+            "fallback": text in FALLBACK_RESPONSES if text else False,
+        }
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index in range(requests):
+            scheduled = started + index / rate if rate else started
+            executor.submit(one, index, scheduled)
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    latencies = sorted(r["latency"] for r in results if r["status"] == 200)
+    service = sorted(r["service"] for r in results if r["status"] == 200)
+    lags = sorted(r["lag"] for r in results)
+    errors = {}
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    count = len(results)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": count,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(latencies[-1] if latencies else None),
+            "mean": ms(sum(latencies) / len(latencies) if latencies else None),
+        },
+        "service_ms": {
+            "p50": ms(percentile(service, 0.50)),
+            "p95": ms(percentile(service, 0.95)),
+            "p99": ms(percentile(service, 0.99)),
+        },
+        "schedule_lag_ms": {
+            "p50": ms(percentile(lags, 0.50)),
+            "p95": ms(percentile(lags, 0.95)),
+            "max": ms(lags[-1]),
+        },
+        "error_rate": round(sum(errors.values()) / count, 4),
+        "errors": errors,
+        "fallback_rate": round(sum(r["fallback"] for r in results) / count, 4),
+    }
+
+
+def compare(report, baseline_path):
+    """Print how this run moved against a saved report"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} ({baseline['config']['target']}):")
+    rows = [("throughput_rps", report["summary"]["throughput_rps"], baseline["summary"]["throughput_rps"])]
+    rows += [
+        (f"{q} ms", report["summary"]["latency_ms"][q], baseline["summary"]["latency_ms"][q])
+        for q in ("p50", "p95", "p99")
+    ]
+    rows.append(("error_rate", report["summary"]["error_rate"], baseline["summary"]["error_rate"]))
+    for name, current, previous in rows:
+        change = f"{(current - previous) / previous * 100:+.1f}%" if current is not None and previous else "n/a"
+        print(f"  {name:<16} {previous!s:>10} -> {current!s:>10}  {change}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=sorted(TARGETS), default='inprocess')
+    parser.add_argument('--traffic', default=default_traffic_path())
+    parser.add_argument('--requests', type=int, default=200, help="total requests, cycling through the traffic")
+    parser.add_argument('--rate', type=float, default=0, help="requests per second; 0 for as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--real-backend', action='store_true', help="call the real Gemini API")
+    parser.add_argument('--output', help="where to save the JSON report")
+    parser.add_argument('--baseline', help="a saved report to compare against")
+    args = parser.parse_args()
+
+    if not args.real_backend:
+        os.environ['MENTOR_BACKEND'] = 'fake'
+    # Keep the harness's own output readable
+    os.environ.setdefault('MENTOR_LOG_LEVEL', 'ERROR')
+
+    items = load_traffic(args.traffic)
+    target = TARGETS[args.target](args)
+    calls_before = target.upstream_calls()
+    results, elapsed = run(target, items, args.requests, args.rate, args.concurrency)
+    calls_after = target.upstream_calls()
+
+    summary = summarize(results, elapsed)
+    if calls_before is not None and calls_after is not None:
+        summary["upstream_calls"] = calls_after - calls_before
+        summary["upstream_calls_per_request"] = round(summary["upstream_calls"] / len(results), 3)
+
+    report = {
+        "config": {
+            "target": args.target,
+            "traffic": os.path.relpath(args.traffic, ROOT),
+            "traffic_items": len(items),
+            "requests": args.requests,
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "revision": git_revision(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith('MENTOR_')},
+        },
+        "summary": summary,
+    }
+    print(json.dumps(report, indent=2))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{args.target}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.baseline:
+        compare(report, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import math
+import os
+import re
+
+from metrics import metrics
+
+# max_output_tokens per conversation type. Farewells ask for 2-3 sentences and
+# answers for at most 4 lines, so the old flat 1024 was never needed.
+DEFAULT_TOKEN_BUDGETS = {
+    'farewell': 128,
+    'greeting': 256,
+    'question': 320,
+    'summary': 256,
+    'crisis': 256,
+}
+
+# Gemini tokenizes English at roughly four characters per token
+CHARS_PER_TOKEN = 4
+
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+metrics.set_buckets('mentor_prompt_tokens', TOKEN_BUCKETS)
+metrics.set_buckets('mentor_output_tokens', TOKEN_BUCKETS)
+metrics.set_buckets('mentor_budget_utilization', RATIO_BUCKETS)
+
+# The end of a sentence, including any closing quotes or brackets after it, or
+# of a line, for replies like poetry that break lines instead of using full stops
+_SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*(?=\s|$)|\n")
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate, good enough for budgeting and metrics"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def split_at_sentence(text):
+    """Split text into (complete sentences, trailing partial sentence)"""
+    end = None
+    for end in _SENTENCE_END.finditer(text):
+        pass
+    if end is None:
+        return "", text
+    return text[:end.end()], text[end.end():]
+
+
+def trim_to_sentence(text):
+    """Cut a truncated generation back to its last complete sentence"""
+    complete, partial = split_at_sentence(text)
+    if complete.strip():
+        return complete.rstrip()
+    # Not even one full sentence; end the fragment visibly instead
+    return partial.rstrip() + "…" if partial.strip() else ""
+
+
+class TokenBudgets:
+    def __init__(self, budgets=None):
+        """
+        Output token budgets by conversation type.
+
+        A mentor's own token_budgets (from mentors.json) take precedence, then
+        a max_output_tokens in the mentor's generation_config (one budget for
+        every conversation type), then these.
+        """
+        self.budgets = dict(DEFAULT_TOKEN_BUDGETS if budgets is None else budgets)
+
+    @classmethod
+    def from_env(cls):
+        """Defaults overridden by MENTOR_TOKEN_BUDGETS, e.g. 'question=400,farewell=96'"""
+        budgets = dict(DEFAULT_TOKEN_BUDGETS)
+        for item in os.getenv('MENTOR_TOKEN_BUDGETS', '').split(','):
+            if '=' in item:
+                kind, tokens = item.split('=', 1)
+                budgets[kind.strip()] = int(tokens)
+        return cls(budgets)
+
+    def budget_for(self, character, conversation_type):
+        """max_output_tokens for a request, or None to keep the model default"""
+        own = getattr(character, 'token_budgets', None) or {}
+        if conversation_type in own:
+            return own[conversation_type]
+        configured = (getattr(character, 'generation_config', None) or {}).get('max_output_tokens')
+        if configured is not None:
+            return configured
+        return self.budgets.get(conversation_type)
+
+    def generation_config(self, character, conversation_type):
+        """The character's generation_config with the budget applied"""
+        config = dict(getattr(character, 'generation_config', None) or {})
+        budget = self.budget_for(character, conversation_type)
+        if budget is not None:
+            config['max_output_tokens'] = budget
+        return config or None
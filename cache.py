@@ -0,0 +1,161 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from cachetools import TTLCache
+
+
+def normalize_question(question):
+    """Reduce a question to a cache-friendly form (case, spacing, trailing punctuation)"""
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.rstrip(" .!?")
+
+
+class MemoryCacheBackend:
+    def __init__(self, maxsize=1024, ttl=3600):
+        """In-process cache with TTL expiry and LRU eviction once maxsize is reached"""
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+
+class SQLiteCacheBackend:
+    def __init__(self, path, maxsize=10000, ttl=86400):
+        """On-disk cache that survives restarts, with the same TTL/LRU policy as the memory backend"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS response_cache_last_access "
+                "ON response_cache (last_access)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            # Evict least recently used rows beyond the size bound
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def after_fork(self):
+        """SQLite connections must not be shared across fork; open a fresh one"""
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM response_cache WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        """Cache mentor responses keyed on (normalized question, mentor, conversation type)"""
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(question, mentor, conversation_type):
+        return f"{mentor}\x1f{conversation_type}\x1f{normalize_question(question)}"
+
+    def get(self, question, mentor, conversation_type):
+        """Return the cached response or None, counting the hit or miss"""
+        value = self.backend.get(self.make_key(question, mentor, conversation_type))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, question, mentor, conversation_type, response):
+        self.backend.set(self.make_key(question, mentor, conversation_type), response)
+
+    def after_fork(self):
+        if hasattr(self.backend, 'after_fork'):
+            self.backend.after_fork()
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+def build_cache_from_env():
+    """Build the response cache described by MENTOR_CACHE_* variables (None when disabled)"""
+    if os.getenv('MENTOR_CACHE', 'on').lower() in ('0', 'off', 'false', 'no'):
+        return None
+
+    maxsize = int(os.getenv('MENTOR_CACHE_SIZE', '1024'))
+    ttl = float(os.getenv('MENTOR_CACHE_TTL', '3600'))
+    path = os.getenv('MENTOR_CACHE_PATH')
+    if path:
+        return ResponseCache(SQLiteCacheBackend(path, maxsize=maxsize, ttl=ttl))
+    return ResponseCache(MemoryCacheBackend(maxsize=maxsize, ttl=ttl))
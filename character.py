@@ -1,29 +1,83 @@
+# Used for characters that do not define their own templates
+DEFAULT_FAREWELL_TEMPLATE = """You are {name}. The student is saying goodbye: "{question}"
+
+Respond with a brief, warm farewell that:
+- Acknowledges their departure respectfully
+- Offers a final piece of wisdom or encouragement
+- Stays true to your character
+- Is concise (2-3 sentences maximum)
+"""
+
+DEFAULT_GREETING_TEMPLATE = """The student greets you with: "{question}"
+
+{prompt}"""
+
+GREETING_REQUEST = "Please introduce yourself and ask how you can help me today."
+
+
 class Character:
-    def __init__(self, name: str, age: int, characteristics: str, memory: str, motive: str, trigger: str):
+    def __init__(self, name: str, age: int, characteristics: str, memory: str, motive: str, trigger: str,
+                 farewell_template: str = None, greeting_template: str = None, generation_config: dict = None,
+                 token_budgets: dict = None):
         self.name = name
         self.age = age
         self.characteristics = characteristics
         self.memory = memory
         self.motive = motive
         self.trigger = trigger
-    
-    def get_prompt(self, question: str) -> str:
+        # Templates take {name} and {question}; the greeting one also takes {prompt}
+        self.farewell_template = farewell_template or DEFAULT_FAREWELL_TEMPLATE
+        self.greeting_template = greeting_template or DEFAULT_GREETING_TEMPLATE
+        # Overrides for the model's generation_config, e.g. temperature
+        self.generation_config = generation_config or None
+        # max_output_tokens per conversation type, see budget.TokenBudgets
+        self.token_budgets = token_budgets or {}
+        self._preamble = None
+        self._closing = None
+
+    @property
+    def preamble(self) -> str:
+        """
+        The static persona part of every prompt, rendered once and reused.
+
+        This is also what gets sent as the model's system_instruction when the
+        persona should not be resent with each question.
+        """
+        if self._preamble is None:
+            self._preamble = (
+                f"You are {self.name}, a wise mentor and guide.\n"
+                f"Age: {self.age}\n"
+                f"Your characteristics: {self.characteristics}\n"
+                f"Your knowledge and experience: {self.memory}\n\n"
+                f"Your teaching approach: {self.motive}\n\n"
+                f"Adjust your response style based on these triggers: {self.trigger}\n\n"
+            )
+        return self._preamble
+
+    def get_prompt(self, question: str, include_preamble: bool = True) -> str:
         """
         Generate a prompt for the language model to answer as this character.
         """
-        prompt = (
-            f"You are {self.name}, a wise mentor and guide.\n"
-            f"Age: {self.age}\n"
-            f"Your characteristics: {self.characteristics}\n"
-            f"Your knowledge and experience: {self.memory}\n\n"
-            f"Your teaching approach: {self.motive}\n\n"
-            f"Adjust your response style based on these triggers: {self.trigger}\n\n"
-            f"A student asks: \"{question}\"\n\n"
-            f"Respond directly as {self.name} with wisdom and guidance. "
-            f"Keep your response conversational and natural (maximum 4 lines). "
-            f"Do not use any formatting like 'Q:' or 'A:' - just speak directly to the student."
+        if self._closing is None:
+            self._closing = (
+                f"Respond directly as {self.name} with wisdom and guidance. "
+                f"Keep your response conversational and natural (maximum 4 lines). "
+                f"Do not use any formatting like 'Q:' or 'A:' - just speak directly to the student."
+            )
+        prompt = f"A student asks: \"{question}\"\n\n{self._closing}"
+        return self.preamble + prompt if include_preamble else prompt
+
+    def get_greeting_prompt(self, question: str, include_preamble: bool = True) -> str:
+        """Prompt for answering a greeting with an introduction"""
+        return self.greeting_template.format(
+            name=self.name,
+            question=question,
+            prompt=self.get_prompt(GREETING_REQUEST, include_preamble),
         )
-        return prompt
+
+    def get_farewell_prompt(self, question: str) -> str:
+        """Prompt for a short in-character goodbye"""
+        return self.farewell_template.format(name=self.name, question=question)
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import re
+
+# Checked in this order: a question containing both a farewell and a greeting is a farewell
+FAREWELL_PATTERNS = [
+    'bye', 'goodbye', 'farewell', 'see you', 'until next time',
+    'thank you for your wisdom', 'i must go', 'i have to leave'
+]
+
+GREETING_PATTERNS = [
+    'hello', 'hi', 'greetings', 'good morning', 'good evening',
+    'hey', 'howdy', 'salutations'
+]
+
+# Self-harm and suicide risk; matched before the conversation type, see engine.detect_crisis
+CRISIS_PATTERNS = [
+    'suicide', 'suicidal', 'kill myself', 'killing myself', 'kms', 'end my life', 'ending my life',
+    'end it all', 'take my own life', 'take my life', 'want to die', 'wanna die', 'wish i was dead',
+    'wish i were dead', 'better off dead', 'better off without me', "don't want to live",
+    'dont want to live', 'do not want to live', "don't want to be alive", 'dont want to be alive',
+    'want to be here anymore', 'want to be here any more', 'no reason to live', 'nothing to live for',
+    "can't go on", 'cant go on', 'hurt myself', 'hurting myself', 'harm myself', 'harming myself',
+    'self harm', 'self-harm', 'overdose', 'overdosed', 'overdosing', 'hang myself', 'hanging myself',
+    'cut myself', 'cutting myself', 'ending it all', 'ended it all', 'point in living', 'point of living',
+    'point in being alive', 'point in staying alive', 'nobody would miss me', 'no one would miss me',
+    'nobody would even miss me', 'no one would even miss me', 'nobody will miss me', 'no one will miss me',
+    'miss me if i was gone', 'miss me if i were gone', 'miss me if i died', 'sleep and never wake up',
+    'sleep and not wake up', 'never wake up again', 'wish i was never born', 'wish i had never been born',
+    "wish i'd never been born",
+]
+
+# Everyday sentences containing a crisis phrase; removed before matching. These
+# are regular expressions over lowercased text, a space matching any whitespace.
+_ACTIVITY = (
+    r"(?:gym|practice|training|workout|working out|exercising|exercise|lifting|running|playing|game|match"
+    r"|football|soccer|basketball|tennis|sports?|climbing|skiing|cooking|hiking)"
+)
+CRISIS_EXCEPTIONS = [
+    r"cut(?:ting)? myself (?:some slack|a break|off)",
+    r"hurt(?:ing)? myself (?:(?:at|in|during|while|when|doing) )?(?:(?:the|a|my) )?" + _ACTIVITY,
+    r"(?:can't|cant|cannot) go on (?:a |an |the |my |our )?(?:vacation|holiday|trip|tour|date|stage|leave"
+    r"|break|cruise|ride|walk|hike|diet|air|camera|tv|social media)",
+    r"overdos(?:e|ed|ing) on (?:coffee|caffeine|sugar|chocolate|tea|energy drinks?|social media|netflix|tv"
+    r"|television|youtube|news|work|carbs|junk food|memes)",
+]
+
+
+def _compile(intents):
+    """Compile {kind: patterns} into [(kind, regex)] over lowercased text, in priority order"""
+    compiled = []
+    for kind, patterns in intents.items():
+        # Longest first so 'goodbye' is preferred over 'bye' at the same position
+        alternatives = sorted({p.strip().lower() for p in patterns if p.strip()}, key=len, reverse=True)
+        if not alternatives:
+            continue
+        body = "|".join(r"\s+".join(re.escape(word) for word in p.split()) for p in alternatives)
+        # The leading lookahead lets the regex engine skip positions that cannot start a phrase
+        lead = "[" + "".join(re.escape(c) for c in sorted({p[0] for p in alternatives})) + "]"
+        compiled.append((kind, re.compile(f"(?={lead})\\b(?:{body})\\b")))
+    return compiled
+
+
+class ConversationClassifier:
+    def __init__(self, intents=None):
+        """
+        Classify questions by intent with patterns compiled once, one regex per intent.
+
+        intents maps kind -> phrases, in priority order. Mentors can add their
+        own phrases with add_patterns or set_mentor_intents; those are compiled
+        into separate regexes that include the shared ones.
+
+        That is slower than the plain substring scan it replaced: about 2us a
+        question against under 1us (benchmarks/bench_classifier.py). The
+        cost buys word boundaries, so 'hi' no longer matches inside 'this'.
+        """
+        if intents is None:
+            intents = {'farewell': FAREWELL_PATTERNS, 'greeting': GREETING_PATTERNS}
+        self.intents = {kind: list(patterns) for kind, patterns in intents.items()}
+        self.priority = list(self.intents)
+        self.mentor_intents = {}
+        self._regexes = _compile(self.intents)
+        self._mentor_regexes = {}
+
+    def add_patterns(self, kind, patterns, mentor=None):
+        """Register extra phrases for an intent, globally or for one mentor only"""
+        if mentor is None:
+            self.intents.setdefault(kind, []).extend(patterns)
+            if kind not in self.priority:
+                self.priority.append(kind)
+            self._regexes = _compile(self.intents)
+            # Mentor regexes embed the shared phrases, so rebuild them too
+            self._mentor_regexes = {}
+        else:
+            extra = self.mentor_intents.setdefault(mentor, {})
+            extra.setdefault(kind, []).extend(patterns)
+            self._mentor_regexes.pop(mentor, None)
+
+    def set_mentor_intents(self, mentor, intents):
+        """Replace one mentor's extra phrases ({kind: patterns}), e.g. from its mentors.json entry"""
+        self.mentor_intents[mentor] = {kind: list(patterns) for kind, patterns in intents.items()}
+        self._mentor_regexes.pop(mentor, None)
+
+    def _regexes_for(self, mentor):
+        extra = self.mentor_intents.get(mentor) if mentor is not None else None
+        if not extra:
+            return self._regexes
+        regexes = self._mentor_regexes.get(mentor)
+        if regexes is None:
+            merged = {kind: list(patterns) for kind, patterns in self.intents.items()}
+            for kind, patterns in extra.items():
+                merged.setdefault(kind, []).extend(patterns)
+            ordered = {kind: merged[kind] for kind in self.priority if kind in merged}
+            ordered.update((kind, p) for kind, p in merged.items() if kind not in ordered)
+            regexes = self._mentor_regexes[mentor] = _compile(ordered)
+        return regexes
+
+    def classify(self, question, mentor=None, default='question'):
+        """Return the highest-priority intent found in the question, or default"""
+        text = question.lower()
+        for kind, regex in self._regexes_for(mentor):
+            if regex.search(text):
+                return kind
+        return default
+
+
+default_classifier = ConversationClassifier()
+
+# Kept separate so crisis phrases never compete with mentor-specific intents
+crisis_classifier = ConversationClassifier({'crisis': CRISIS_PATTERNS})
+
+_CRISIS_EXCEPTIONS = re.compile(
+    r"\b(?:" + "|".join(p.replace(" ", r"\s+") for p in CRISIS_EXCEPTIONS) + r")\b"
+)
+
+
+def is_crisis(question):
+    """Whether the question contains a crisis phrase outside the known everyday idioms"""
+    text = _CRISIS_EXCEPTIONS.sub(" ", question.lower().replace('\u2019', "'"))
+    return crisis_classifier.classify(text, default=None) == 'crisis'
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """Share one in-flight call between concurrent callers asking for the same key"""
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers of key and give each its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """Event-loop counterpart of SingleFlight for coroutine callers"""
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Await fn() once for all concurrent callers of key and give each its result"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so one caller cancelling does not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = self._calls[key] = asyncio.ensure_future(fn())
+        self.calls += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._forget(key, future)
+            else:
+                future.add_done_callback(lambda f: self._forget(key, f))
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+
+class OverloadedError(Exception):
+    """Raised when a request is rejected to protect the server from overload"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrency=64, max_queue=256, queue_timeout=5.0):
+        """
+        Bound the number of in-flight generations on an event loop.
+
+        Up to max_concurrency requests run at once and up to max_queue more wait
+        for a slot. Anything beyond that, or anything that waits longer than
+        queue_timeout seconds, is rejected with OverloadedError.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a limiter from MENTOR_MAX_CONCURRENCY, MENTOR_MAX_QUEUE and MENTOR_QUEUE_TIMEOUT"""
+        return cls(
+            max_concurrency=int(os.getenv('MENTOR_MAX_CONCURRENCY', '64')),
+            max_queue=int(os.getenv('MENTOR_MAX_QUEUE', '256')),
+            queue_timeout=float(os.getenv('MENTOR_QUEUE_TIMEOUT', '5')),
+        )
+
+    async def __aenter__(self):
+        # Created lazily so the semaphore binds to the serving loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if not self._semaphore.locked():
+            # A free slot is taken without yielding to the loop
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError("Server is at capacity. Please retry shortly.")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise OverloadedError("Timed out waiting for a free mentor. Please retry shortly.")
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.active -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
@@ -0,0 +1,533 @@
+import os
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from budget import TokenBudgets, estimate_tokens
+from cache import build_cache_from_env, normalize_question
+from classifier import default_classifier, is_crisis
+from coalesce import AsyncSingleFlight, SingleFlight
+from model import GeminiResponder, FALLBACK_RESPONSES, UpstreamUnavailableError, is_fallback
+from normalize import clean_unicode_text
+from pool import ResponderPool
+from safety import crisis_follow_up_prompt, crisis_response
+from semantic import ExclusionList, build_semantic_cache_from_env
+from mentors import MentorRegistry, default_registry
+from metrics import NULL_TIMER, metrics
+from sessions import SUMMARY_PROMPT, SessionStore, build_session_store_from_env, format_transcript
+
+logger = logging.getLogger(__name__)
+
+
+def detect_conversation_type(question, mentor=None):
+    """Detect if the user is greeting, saying goodbye, or asking a question"""
+    return default_classifier.classify(question, mentor=mentor)
+
+def detect_crisis(question):
+    """Whether the question shows self-harm or suicide risk; checked before anything else"""
+    return is_crisis(question)
+
+def build_contextual_prompt(character, question, conversation_type, include_preamble=True):
+    """
+    Build the prompt that fits the conversation context.
+
+    With include_preamble=False the character's static persona is left out,
+    for models that already carry it as their system_instruction.
+    """
+    if conversation_type == 'farewell':
+        return character.get_farewell_prompt(question)
+    elif conversation_type == 'greeting':
+        return character.get_greeting_prompt(question, include_preamble)
+    else:
+        return character.get_prompt(question, include_preamble)
+
+def get_fallback_response(character, conversation_type):
+    """Canned in-character reply used when the model cannot answer"""
+    if conversation_type == 'farewell':
+        return "Until we meet again on your journey of growth. Walk your path with wisdom."
+    elif conversation_type == 'greeting':
+        return f"Greetings, seeker. I am {character.name}. How may I guide you today?"
+    else:
+        return "I'm taking a moment to reflect on your question. Let me offer you guidance in a different way."
+
+class RequestError(ValueError):
+    """A /respond payload that fails validation"""
+
+def validate_request(data, mentor_options=None):
+    """Validate a /respond payload and return its (question, mentor_option)"""
+    if not data:
+        raise RequestError("No JSON data provided")
+    if not isinstance(data, dict):
+        raise RequestError("Request body must be a JSON object")
+
+    question = data.get('question', '')
+    question = question.strip() if isinstance(question, str) else ''
+    mentor_option = data.get('mentor_option')
+
+    if not question:
+        raise RequestError("Missing or empty 'question' in request body")
+    if mentor_option is None:
+        raise RequestError("Missing 'mentor_option' in request body")
+
+    try:
+        mentor_option = int(mentor_option)
+    except (ValueError, TypeError):
+        raise RequestError("mentor_option must be a valid integer")
+    if mentor_options is None:
+        mentor_options = default_registry().options()
+    if mentor_option not in mentor_options:
+        if len(mentor_options) == 1:
+            raise RequestError(f"Invalid mentor_option. Must be {mentor_options[0]}")
+        options = ", ".join(str(i) for i in mentor_options[:-1])
+        raise RequestError(f"Invalid mentor_option. Must be {options}, or {mentor_options[-1]}")
+
+    return question, mentor_option
+
+def validate_session_id(data):
+    """
+    Return the session_id for a /respond payload, or None for a stateless request.
+
+    Clients send "session": true to have a session started and then pass the
+    session_id echoed back in the response. Only ids issued by this service
+    are accepted, so one client can never read another's conversation.
+    """
+    session_id = data.get('session_id')
+    if session_id is None:
+        return SessionStore.new_session_id() if data.get('session') is True else None
+    if not SessionStore.is_valid_session_id(session_id):
+        raise RequestError("Unknown session_id. Send \"session\": true to start a new session")
+    return session_id
+
+class MentorEngine:
+    def __init__(self, model, mentors=None, cache=None, coalesce=True, use_system_instruction=False,
+                 sessions=None, fold_diacritics=False, budgets=None, semantic_cache=None, cache_exclusions=None,
+                 crisis_follow_up=True, batch_workers=16):
+        """Hold a ready-to-use model and mentor set for answering many questions"""
+        self.model = model
+        self.fold_diacritics = fold_diacritics
+        self.sessions = sessions
+        # Send each persona once as system_instruction instead of inside every prompt
+        self.use_system_instruction = use_system_instruction
+        # Mentors come from the registry (mentors.json) unless given explicitly
+        if mentors is None:
+            mentors = default_registry()
+        elif not isinstance(mentors, MentorRegistry):
+            mentors = MentorRegistry.from_characters(mentors)
+        self.mentors = mentors
+        self.cache = cache
+        # Paraphrase-tolerant lookups after an exact cache miss
+        self.semantic_cache = semantic_cache
+        # Crisis-related questions always go to the model, never to a cache
+        self.cache_exclusions = cache_exclusions if cache_exclusions is not None else ExclusionList()
+        # max_output_tokens per conversation type and mentor
+        self.budgets = budgets if budgets is not None else TokenBudgets()
+        # After the safety response, let the mentor add a personal follow-up when streaming
+        self.crisis_follow_up = crisis_follow_up
+        # Identical in-flight questions share one upstream generation
+        self.single_flight = SingleFlight() if coalesce else None
+        self.async_single_flight = AsyncSingleFlight() if coalesce else None
+        # One pool for every batch call, so batch threads per process stay bounded
+        self.batch_workers = batch_workers
+        self._batch_executor = None
+        self._batch_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build an engine from GEMINI_API_KEY (loaded from .env if present).
+
+        With MENTOR_BACKEND=fake no key is needed; model calls are answered
+        in-process by backends.FakeBackend.
+        """
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        api_key = os.getenv('GEMINI_API_KEY')
+        # GEMINI_API_KEYS (comma separated) spreads load over several keys
+        api_keys = [k.strip() for k in os.getenv('GEMINI_API_KEYS', '').split(',') if k.strip()]
+        fake = os.getenv('MENTOR_BACKEND', 'gemini').lower() == 'fake'
+        if not api_key and not api_keys and not fake:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+        if len(api_keys) > 1 or os.getenv('MENTOR_LIGHT_MODELS'):
+            model = ResponderPool.from_env(api_keys or [api_key or 'fake'])
+        else:
+            model = GeminiResponder(api_key=api_key or (api_keys[0] if api_keys else None))
+        coalesce = os.getenv('MENTOR_COALESCE', 'on').lower() not in ('0', 'off', 'false', 'no')
+        use_system_instruction = os.getenv('MENTOR_SYSTEM_INSTRUCTION', 'off').lower() in ('1', 'on', 'true', 'yes')
+        engine = cls(
+            model,
+            cache=build_cache_from_env(),
+            coalesce=coalesce,
+            use_system_instruction=use_system_instruction,
+            fold_diacritics=os.getenv('MENTOR_FOLD_DIACRITICS', 'off').lower() in ('1', 'on', 'true', 'yes'),
+            budgets=TokenBudgets.from_env(),
+            semantic_cache=build_semantic_cache_from_env(),
+            cache_exclusions=ExclusionList.from_env(),
+            crisis_follow_up=os.getenv('MENTOR_CRISIS_FOLLOW_UP', 'on').lower() not in ('0', 'off', 'false', 'no'),
+            batch_workers=int(os.getenv('MENTOR_BATCH_MAX_PARALLELISM', '16')),
+        )
+        engine.sessions = build_session_store_from_env(summarizer=engine.summarize)
+        return engine
+
+    def get_character(self, option):
+        """Return the mentor for a mentor_option index"""
+        return self.mentors.get(option)
+
+    def detect(self, question, character=None):
+        """Classify the question as crisis, greeting, farewell or question"""
+        if detect_crisis(question):
+            return 'crisis'
+        return detect_conversation_type(question, character.name if character is not None else None)
+
+    def crisis_response(self, character):
+        """The vetted safety reply, sent without waiting for the model"""
+        metrics.increment('mentor_crisis_responses_total', mentor=character.name)
+        return crisis_response()
+
+    def clean(self, text):
+        """Normalize the model output for display"""
+        return clean_unicode_text(text, fold=self.fold_diacritics)
+
+    def respond(self, question, option, session_id=None, timer=NULL_TIMER):
+        """Run the full detect/respond/clean pipeline for one question"""
+        character = self.get_character(option)
+        with timer.stage('classification'):
+            conversation_type = self.detect(question, character)
+        timer.label(mentor=character.name, conversation_type=conversation_type)
+        if conversation_type == 'crisis':
+            return self.crisis_response(character)
+        try:
+            if session_id is not None and self.sessions is not None:
+                response = self.generate_in_session(character, question, conversation_type, session_id, timer)
+            else:
+                response = self.generate(character, question, conversation_type, timer)
+            with timer.stage('cleanup'):
+                return self.clean(response)
+        except UpstreamUnavailableError as e:
+            logger.warning("Falling back, model unavailable: %s", e)
+            return get_fallback_response(character, conversation_type)
+        except Exception:
+            logger.exception("Falling back after generation error")
+            return get_fallback_response(character, conversation_type)
+
+    async def respond_async(self, question, option, timer=NULL_TIMER):
+        """Async variant of respond for event-loop based serving"""
+        character = self.get_character(option)
+        with timer.stage('classification'):
+            conversation_type = self.detect(question, character)
+        timer.label(mentor=character.name, conversation_type=conversation_type)
+        if conversation_type == 'crisis':
+            return self.crisis_response(character)
+        try:
+            response = await self.generate_async(character, question, conversation_type, timer)
+            with timer.stage('cleanup'):
+                return self.clean(response)
+        except UpstreamUnavailableError as e:
+            logger.warning("Falling back, model unavailable: %s", e)
+            return get_fallback_response(character, conversation_type)
+        except Exception:
+            logger.exception("Falling back after generation error")
+            return get_fallback_response(character, conversation_type)
+
+    def batch_executor(self):
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers,
+                                                          thread_name_prefix="batch")
+            return self._batch_executor
+
+    def respond_batch(self, items, max_parallelism=8, item_timeout=30.0):
+        """
+        Answer many {question, mentor_option} items on the engine's batch pool.
+
+        Results come back in input order, each either {"response": ...} or
+        {"error": ...}. At most max_parallelism items of one call are in
+        flight at a time, and all calls share batch_workers threads. An item
+        not answered within item_timeout seconds of being submitted is
+        reported as timed out.
+        """
+        results = [None] * len(items)
+        queue = []
+        mentor_options = self.mentors.options()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {"error": "Each item must be a JSON object"}
+                continue
+            try:
+                queue.append((index, *validate_request(item, mentor_options)))
+            except RequestError as e:
+                results[index] = {"error": str(e)}
+        queue.reverse()
+
+        def run(question, option):
+            timer = metrics.request_timer()
+            try:
+                return self.respond(question, option, timer=timer)
+            finally:
+                timer.finish('mentor_batch_item_seconds')
+
+        executor = self.batch_executor()
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < max(1, max_parallelism):
+                index, question, option = queue.pop()
+                pending[executor.submit(run, question, option)] = (index, time.monotonic())
+
+            done, _ = wait(pending, timeout=min(item_timeout, 0.05), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, _ = pending.pop(future)
+                try:
+                    results[index] = {"response": future.result().strip()}
+                except Exception as e:
+                    results[index] = {"error": f"Internal server error: {e}"}
+
+            now = time.monotonic()
+            for future, (index, submitted) in list(pending.items()):
+                if now - submitted > item_timeout:
+                    # A running item keeps its thread until the model returns; don't wait for it
+                    future.cancel()
+                    del pending[future]
+                    results[index] = {"error": "Request timed out. The mentor is taking too long to respond."}
+
+        return results
+
+    def stream(self, question, option):
+        """Yield cleaned response chunks as the model produces them"""
+        character = self.get_character(option)
+        conversation_type = self.detect(question, character)
+        if conversation_type == 'crisis':
+            yield self.crisis_response(character)
+            if self.crisis_follow_up:
+                yield from self.crisis_follow_up_stream(character, question)
+            return
+
+        cached = self._cached_response(character, question, conversation_type)
+        if cached is not None:
+            yield self.clean(cached)
+            return
+
+        chunks = []
+        try:
+            prompt, system_instruction = self.build_prompt(character, question, conversation_type)
+            generation_config = self.generation_config(character, conversation_type, prompt, system_instruction)
+            for chunk in self.model.stream_response(
+                prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            ):
+                chunks.append(chunk)
+                yield self.clean(chunk)
+        except Exception:
+            if not chunks:
+                yield get_fallback_response(character, conversation_type)
+            return
+
+        self._record_output(character, conversation_type, generation_config, "".join(chunks))
+        if not any(chunk.strip() in FALLBACK_RESPONSES for chunk in chunks):
+            self._store_response(character, question, conversation_type, "".join(chunks))
+
+    def crisis_follow_up_stream(self, character, question):
+        """The mentor's personal follow-up to a crisis message; never cached, silent on failure"""
+        if self.use_system_instruction:
+            prompt, system_instruction = crisis_follow_up_prompt(character, question, False), character.preamble
+        else:
+            prompt, system_instruction = crisis_follow_up_prompt(character, question), None
+        generation_config = self.generation_config(character, 'crisis', prompt, system_instruction)
+        first = True
+        try:
+            for chunk in self.model.stream_response(
+                prompt, system_instruction=system_instruction, conversation_type='crisis',
+                generation_config=generation_config,
+            ):
+                # The safety response already went out; generic fallbacks would only add noise
+                if chunk.strip() in FALLBACK_RESPONSES:
+                    continue
+                yield self.clean("\n\n" + chunk if first else chunk)
+                first = False
+        except Exception as e:
+            logger.warning("Crisis follow-up failed: %s", e)
+
+    def generate(self, character, question, conversation_type, timer=NULL_TIMER):
+        """Get the raw model response, served from the response cache when possible"""
+        with timer.stage('cache_lookup'):
+            cached = self._cached_response(character, question, conversation_type)
+        if cached is not None:
+            return cached
+
+        def call():
+            with timer.stage('prompt_build'):
+                prompt, system_instruction = self.build_prompt(character, question, conversation_type)
+                generation_config = self.generation_config(character, conversation_type, prompt, system_instruction)
+            with timer.stage('model_call'):
+                response = self.model.get_response(
+                    prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                    generation_config=generation_config,
+                )
+            self._record_output(character, conversation_type, generation_config, response)
+            self._store_response(character, question, conversation_type, response)
+            return response
+
+        if self.single_flight is None:
+            return call()
+        return self.single_flight.do(self._flight_key(character, question, conversation_type), call)
+
+    async def generate_async(self, character, question, conversation_type, timer=NULL_TIMER):
+        """Async variant of generate"""
+        with timer.stage('cache_lookup'):
+            cached = self._cached_response(character, question, conversation_type)
+        if cached is not None:
+            return cached
+
+        async def call():
+            with timer.stage('prompt_build'):
+                prompt, system_instruction = self.build_prompt(character, question, conversation_type)
+                generation_config = self.generation_config(character, conversation_type, prompt, system_instruction)
+            with timer.stage('model_call'):
+                response = await self.model.get_response_async(
+                    prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                    generation_config=generation_config,
+                )
+            self._record_output(character, conversation_type, generation_config, response)
+            self._store_response(character, question, conversation_type, response)
+            return response
+
+        if self.async_single_flight is None:
+            return await call()
+        return await self.async_single_flight.do(self._flight_key(character, question, conversation_type), call)
+
+    def generate_in_session(self, character, question, conversation_type, session_id, timer=NULL_TIMER):
+        """Answer within a conversation session; never cached, since the answer depends on history"""
+        with timer.stage('prompt_build'):
+            history = self.sessions.get_chat_history(session_id, character.name)
+            prompt, system_instruction = self.build_prompt(character, question, conversation_type)
+            generation_config = self.generation_config(
+                character, conversation_type, prompt, system_instruction, history
+            )
+        with timer.stage('model_call'):
+            response = self.model.get_chat_response(
+                history, prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            )
+        self._record_output(character, conversation_type, generation_config, response)
+        if response and not is_fallback(response):
+            self.sessions.append(session_id, character.name, question, response)
+        return response
+
+    def summarize(self, mentor, summary, turns):
+        """Fold older session turns into a short running summary"""
+        prompt = SUMMARY_PROMPT.format(
+            mentor=mentor,
+            summary=summary or "(none)",
+            transcript=format_transcript(turns),
+        )
+        budget = self.budgets.budget_for(None, 'summary')
+        response = self.model.get_response(
+            prompt, conversation_type='summary',
+            generation_config={"max_output_tokens": budget} if budget else None,
+        )
+        if is_fallback(response):
+            raise ValueError("Summary generation failed")
+        return response.strip()
+
+    def build_prompt(self, character, question, conversation_type):
+        """Return the (prompt, system_instruction) pair to send for a question"""
+        if not self.use_system_instruction:
+            return build_contextual_prompt(character, question, conversation_type), None
+        prompt = build_contextual_prompt(character, question, conversation_type, include_preamble=False)
+        return prompt, character.preamble
+
+    def generation_config(self, character, conversation_type, prompt, system_instruction=None, history=()):
+        """
+        The generation_config to send, with the token budget applied.
+
+        Also records the prompt size, counted before sending with a local
+        estimate; the count_tokens API would cost a round trip per request.
+        """
+        prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction)
+        prompt_tokens += sum(estimate_tokens(part) for turn in history or () for part in turn["parts"])
+        metrics.observe('mentor_prompt_tokens', prompt_tokens,
+                        mentor=character.name, conversation_type=conversation_type)
+        return self.budgets.generation_config(character, conversation_type)
+
+    def _record_output(self, character, conversation_type, generation_config, response):
+        """Record how much of the output budget a (non-fallback) answer used"""
+        if is_fallback(response):
+            return
+        tokens = estimate_tokens(response)
+        metrics.observe('mentor_output_tokens', tokens, mentor=character.name, conversation_type=conversation_type)
+        budget = (generation_config or {}).get('max_output_tokens')
+        if budget:
+            metrics.observe('mentor_budget_utilization', min(1.0, tokens / budget),
+                            mentor=character.name, conversation_type=conversation_type)
+
+    def preload(self):
+        """Build per-mentor state up front, e.g. in a server's parent process before it forks"""
+        for character in self.mentors:
+            character.preamble
+
+    def warm_up(self, connect=True, timeout=10.0):
+        """
+        Get everything the first request needs ready: mentors and prompt
+        preambles, the model SDK, models and the channel to the API.
+
+        connect=False stops short of anything that cannot cross a fork.
+        Returns the seconds spent on each step.
+        """
+        started = time.perf_counter()
+        self.preload()
+        timings = {"mentors": time.perf_counter() - started}
+        if hasattr(self.model, 'warm_up'):
+            system_instructions = [c.preamble for c in self.mentors] if self.use_system_instruction else ()
+            timings["model"] = self.model.warm_up(system_instructions, connect=connect, timeout=timeout)
+        return timings
+
+    def after_fork(self):
+        """Reinitialize connections and threads in a forked worker process"""
+        for component in (self.model, self.cache, self.sessions):
+            if hasattr(component, 'after_fork'):
+                component.after_fork()
+        # Executor threads do not survive fork
+        self._batch_executor = None
+        self._batch_lock = threading.Lock()
+
+    def stats(self):
+        """Counters for the layers that avoid upstream model calls"""
+        return {
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache is not None else None,
+            "coalescing": self.single_flight.stats() if self.single_flight is not None else None,
+            "async_coalescing": self.async_single_flight.stats() if self.async_single_flight is not None else None,
+            "sessions": self.sessions.stats() if self.sessions is not None else None,
+            "mentors": self.mentors.stats(),
+            "upstream": self.model.stats() if hasattr(self.model, 'stats') else None,
+        }
+
+    @staticmethod
+    def _flight_key(character, question, conversation_type):
+        return (character.name, conversation_type, normalize_question(question))
+
+    def _cached_response(self, character, question, conversation_type):
+        if self.cache is None and self.semantic_cache is None:
+            return None
+        if self.cache_exclusions.matches(question):
+            return None
+        if self.cache is not None:
+            cached = self.cache.get(question, character.name, conversation_type)
+            if cached is not None:
+                return cached
+        if self.semantic_cache is not None:
+            cached, similarity = self.semantic_cache.get(question, character.name, conversation_type)
+            if cached is not None:
+                logger.debug("Semantic cache hit (similarity %.2f)", similarity)
+            return cached
+        return None
+
+    def _store_response(self, character, question, conversation_type, response):
+        # Canned fallbacks mean the model did not really answer; ask again next time
+        if is_fallback(response) or self.cache_exclusions.matches(question):
+            return
+        if self.cache is not None:
+            self.cache.set(question, character.name, conversation_type, response)
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(question, character.name, conversation_type, response)
@@ -0,0 +1,88 @@
+"""
+Production server settings for the mentor API.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master process (preload_app), so the
+mentors, prompt preambles and configuration are built before the workers
+fork and shared copy-on-write. Connections that must not cross a fork,
+the gRPC channels to the model, SQLite handles and helper threads, are
+rebuilt in each worker by post_fork.
+
+Each worker then warms up in the background (see startup.py) and reports
+ready on /health/ready once its model channel is open; point the load
+balancer's readiness check there and the liveness check at /health/live.
+
+On SIGTERM workers stop accepting connections, report "draining" on
+/health and let in-flight generations finish for up to graceful_timeout
+seconds before exiting.
+
+Tuning, all optional:
+  MENTOR_BIND               address to listen on (default 0.0.0.0:$PORT or :5000)
+  MENTOR_WORKERS            worker processes (default: CPU count)
+  MENTOR_THREADS            threads per worker (default 16); model calls
+                            wait on the network, so threads are cheap
+  MENTOR_WORKER_CLASS       gthread (default), or uvicorn.workers.UvicornWorker
+                            with asgi_app:app
+  MENTOR_WORKER_TIMEOUT     seconds before a stuck worker is restarted (default 60)
+  MENTOR_GRACEFUL_TIMEOUT   seconds to drain on shutdown (default 30)
+  MENTOR_MAX_REQUESTS       recycle a worker after this many requests (default 0, never)
+"""
+import os
+import signal
+import sys
+
+bind = os.getenv('MENTOR_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('MENTOR_WORKERS', str(os.cpu_count() or 1)))
+threads = int(os.getenv('MENTOR_THREADS', '16'))
+worker_class = os.getenv('MENTOR_WORKER_CLASS', 'gthread')
+timeout = int(os.getenv('MENTOR_WORKER_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('MENTOR_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+max_requests = int(os.getenv('MENTOR_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+
+# The app modules leave warm-up to the hooks below
+os.environ.setdefault('MENTOR_WARMUP', 'post_fork')
+
+
+def _app_modules():
+    """The app modules loaded in this process (app.py and/or asgi_app.py)"""
+    return [sys.modules[name] for name in ('app', 'asgi_app') if name in sys.modules]
+
+
+def when_ready(server):
+    # Imports, mentors and preambles only; channels are opened per worker
+    for module in _app_modules():
+        if hasattr(module, 'warmup'):
+            module.warmup.run(connect=False)
+
+
+def post_fork(server, worker):
+    for module in _app_modules():
+        if getattr(module, 'engine', None) is not None:
+            module.engine.after_fork()
+        if hasattr(module, 'warmup'):
+            module.warmup.after_fork()
+
+
+def post_worker_init(worker):
+    # After the app is loaded, with or without preload_app
+    for module in _app_modules():
+        if hasattr(module, 'warmup'):
+            module.warmup.start()
+
+    # Chain onto the worker's own SIGTERM handler so /health reports draining
+    # while in-flight requests finish
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        for module in _app_modules():
+            if hasattr(module, 'draining'):
+                module.draining.set()
+        worker.log.info("Worker %s draining", worker.pid)
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain)
@@ -0,0 +1,52 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+_listener = None
+
+
+def configure_logging(level=None):
+    """
+    Route all logging through a QueueHandler so request threads never block on I/O.
+
+    A single QueueListener thread writes the records to stderr. The level comes
+    from MENTOR_LOG_LEVEL (default INFO); request payloads are only logged at
+    DEBUG. Safe to call more than once.
+    """
+    global _listener
+    level = level or os.getenv('MENTOR_LOG_LEVEL', 'INFO').upper()
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"
+    ))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    """The listener thread does not survive fork; start a new one in the child"""
+    global _listener
+    _listener = logging.handlers.QueueListener(
+        _listener.queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
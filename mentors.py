@@ -0,0 +1,224 @@
+"""
+Mentor registry loaded from mentors.json.
+
+Each entry gives a mentor's persona fields (long text may be a list of
+strings, joined as-is), optional farewell_template and greeting_template,
+an optional generation_config that overrides the model defaults for that
+mentor (its max_output_tokens replaces the global per-type budgets), and
+optional token_budgets ({"question": 400, ...}) overriding the
+max_output_tokens per conversation type, and optional intents
+({"greeting": ["namaste"], ...}) adding phrases the classifier recognises
+for that mentor only.
+
+mentor_option numbers entries by their id (the name when there is none).
+At startup they are numbered in file order; a hot reload keeps each id's
+number, numbers new ids after the existing ones and makes a removed id's
+number invalid, so live clients never get a different mentor. Only
+appending keeps the numbers across a restart.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from character import Character
+from classifier import default_classifier
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mentors.json')
+
+REQUIRED_FIELDS = ('name', 'age', 'characteristics', 'memory', 'motive', 'trigger')
+
+
+def _text(value):
+    return "".join(value) if isinstance(value, list) else value
+
+
+def mentor_id(spec):
+    return spec.get('id', spec['name'])
+
+
+def character_from_spec(spec):
+    """Build a Character from one registry entry and register its intents"""
+    default_classifier.set_mentor_intents(spec['name'], spec.get('intents') or {})
+    return Character(
+        name=spec['name'],
+        age=spec['age'],
+        characteristics=_text(spec['characteristics']),
+        memory=_text(spec['memory']),
+        motive=_text(spec['motive']),
+        trigger=_text(spec['trigger']),
+        farewell_template=_text(spec.get('farewell_template')),
+        greeting_template=_text(spec.get('greeting_template')),
+        generation_config=spec.get('generation_config'),
+        token_budgets=spec.get('token_budgets'),
+    )
+
+
+def load_specs(path):
+    """Read and check the mentor entries in a registry file"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    specs = data.get('mentors') if isinstance(data, dict) else data
+    if not isinstance(specs, list) or not specs:
+        raise ValueError(f"{path} must define a non-empty 'mentors' list")
+    names, ids = set(), set()
+    for index, spec in enumerate(specs):
+        missing = [field for field in REQUIRED_FIELDS if field not in spec]
+        if missing:
+            raise ValueError(f"Mentor {index} in {path} is missing {', '.join(missing)}")
+        if spec['name'] in names:
+            raise ValueError(f"Duplicate mentor name in {path}: {spec['name']}")
+        if mentor_id(spec) in ids:
+            raise ValueError(f"Duplicate mentor id in {path}: {mentor_id(spec)}")
+        intents = spec.get('intents', {})
+        if not isinstance(intents, dict) or any(
+                kind not in default_classifier.priority or not isinstance(patterns, list)
+                or not all(isinstance(p, str) for p in patterns)
+                for kind, patterns in intents.items()):
+            kinds = ", ".join(default_classifier.priority)
+            raise ValueError(f"Mentor {index} in {path}: intents must map {kinds} to lists of phrases")
+        names.add(spec['name'])
+        ids.add(mentor_id(spec))
+    return specs
+
+
+class MentorRegistry:
+    def __init__(self, path=DEFAULT_REGISTRY_PATH, reload_interval=None, specs=None):
+        """
+        The available mentors, built on first use.
+
+        With reload_interval set, the file's modification time is checked at
+        most that often (in seconds) and a changed file is loaded without a
+        restart. Mentors whose entry did not change keep their instance, and
+        every id keeps its mentor_option. A file that fails to load is logged
+        and the previous mentors are kept.
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        if specs is None:
+            self._mtime = os.path.getmtime(path)
+            specs = load_specs(path)
+        else:
+            self._mtime = None
+        # Indexed by mentor_option; a removed mentor leaves None behind
+        self._specs = list(specs)
+        self._characters = [None] * len(self._specs)
+        self._options = {mentor_id(spec): option for option, spec in enumerate(self._specs)}
+
+    @classmethod
+    def from_characters(cls, characters):
+        """A fixed registry over ready-made Character objects"""
+        registry = cls(path=None, specs=[{"name": c.name} for c in characters])
+        registry._characters = list(characters)
+        return registry
+
+    def _maybe_reload(self):
+        if self.path is None or self.reload_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            changed = os.path.getmtime(self.path) != self._mtime
+        except OSError:
+            changed = False
+        if changed:
+            self.reload()
+
+    def reload(self):
+        """Load the registry file again, keeping unchanged mentors"""
+        mtime = None
+        try:
+            mtime = os.path.getmtime(self.path)
+            specs = load_specs(self.path)
+        except (OSError, ValueError) as e:
+            # Don't retry the same broken file on every check
+            self._mtime = mtime or self._mtime
+            self.reload_errors += 1
+            logger.error("Keeping current mentors, could not load %s: %s", self.path, e)
+            return False
+        with self._lock:
+            options = dict(self._options)
+            for spec in specs:
+                options.setdefault(mentor_id(spec), len(options))
+            slots = [None] * len(options)
+            characters = [None] * len(options)
+            for spec in specs:
+                option = options[mentor_id(spec)]
+                slots[option] = spec
+                if option < len(self._specs) and self._specs[option] == spec:
+                    characters[option] = self._characters[option]
+            self._specs = slots
+            self._characters = characters
+            self._options = options
+            self._mtime = mtime
+            self.reloads += 1
+        logger.info("Loaded %d mentors from %s", len(specs), self.path)
+        return True
+
+    def __len__(self):
+        return len(self.options())
+
+    def options(self):
+        """The valid mentor_option values"""
+        self._maybe_reload()
+        with self._lock:
+            return [option for option, spec in enumerate(self._specs) if spec is not None]
+
+    def get(self, option):
+        """Return the mentor for a mentor_option index, building it on first use"""
+        self._maybe_reload()
+        with self._lock:
+            if option not in range(len(self._specs)) or self._specs[option] is None:
+                raise ValueError(f"Invalid mentor option: {option}")
+            character = self._characters[option]
+            if character is None:
+                character = self._characters[option] = character_from_spec(self._specs[option])
+            return character
+
+    def __iter__(self):
+        return iter([self.get(option) for option in self.options()])
+
+    def names(self):
+        """{mentor_option: name}"""
+        with self._lock:
+            return {option: spec['name'] for option, spec in enumerate(self._specs) if spec is not None}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "mentors": sum(spec is not None for spec in self._specs),
+                "instantiated": sum(c is not None for c in self._characters),
+                "reloads": self.reloads,
+                "reload_errors": self.reload_errors,
+            }
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """
+    The process-wide registry described by MENTOR_REGISTRY (a JSON file,
+    default mentors.json) and MENTOR_REGISTRY_RELOAD (seconds between
+    checks for changes, default 5; 0 turns hot reload off).
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            interval = float(os.getenv('MENTOR_REGISTRY_RELOAD', '5'))
+            _default_registry = MentorRegistry(
+                os.getenv('MENTOR_REGISTRY', DEFAULT_REGISTRY_PATH),
+                reload_interval=interval if interval > 0 else None,
+            )
+        return _default_registry
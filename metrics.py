@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Latency buckets in seconds, from cache hits up to the request timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Thread-safe labelled histograms and counters"""
+        self._histograms = {}
+        self._counters = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_buckets(self, name, buckets):
+        """Use these bucket bounds for a histogram instead of the latency ones"""
+        with self._lock:
+            self._buckets[name] = tuple(buckets)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def request_timer(self):
+        return RequestTimer(self)
+
+    def snapshot(self):
+        """All metrics as JSON-friendly dicts"""
+        with self._lock:
+            return {
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+            }
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (v.replace('\\', '\\\\').replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (hname, labels), histogram in sorted(self._histograms.items()):
+                    if hname != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{fmt(labels, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{fmt(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{fmt(labels)} {histogram.count}")
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (cname, labels), value in sorted(self._counters.items()):
+                    if cname == name:
+                        lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimer:
+    def __init__(self, registry):
+        """
+        Per-request stage timings.
+
+        Stages are recorded as they finish and flushed to the registry in
+        finish(), so every stage carries the mentor and conversation_type
+        labels even though those are only known after classification.
+        """
+        self.registry = registry
+        self.labels = {"mentor": "", "conversation_type": ""}
+        self.stages = []
+        self.started = time.perf_counter()
+
+    def label(self, **labels):
+        self.labels.update(labels)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - started))
+
+    def finish(self, name="mentor_request_seconds", **labels):
+        """Record the stage timings and the total request time"""
+        labels = {**self.labels, **labels}
+        stage_labels = {k: labels[k] for k in ("mentor", "conversation_type")}
+        for stage, seconds in self.stages:
+            self.registry.observe("mentor_stage_seconds", seconds, stage=stage, **stage_labels)
+        self.registry.observe(name, time.perf_counter() - self.started, **labels)
+
+
+class NullTimer:
+    """Stand-in for RequestTimer when the caller does not collect timings"""
+
+    def label(self, **labels):
+        pass
+
+    def stage(self, name):
+        return nullcontext()
+
+    def finish(self, name=None, **labels):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+# Process-wide registry exported at /metrics
+metrics = MetricsRegistry()
@@ -1,12 +1,317 @@
-import google.generativeai as genai
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from backends import build_backend_from_env
+from budget import CHARS_PER_TOKEN, split_at_sentence, trim_to_sentence
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Canned replies returned instead of model output when generation does not complete
+PAUSE_RESPONSE = "I'm reflecting on your words..."
+MAX_TOKENS_RESPONSE = "Let me pause here and continue this thought..."
+SAFETY_RESPONSE = "I sense your question touches on sensitive ground. Let me guide you with wisdom while being mindful of our conversation's direction. Could you perhaps share more context about what you're truly seeking?"
+RECITATION_RESPONSE = "I notice our conversation may be echoing familiar patterns. Let me offer you fresh perspective and original guidance instead."
+UNKNOWN_RESPONSE = "I'm taking a moment to gather my thoughts. Please share more about what weighs on your mind."
+BLOCKED_RESPONSE = "I understand you're seeking guidance, but I need to approach this topic more carefully. Could you help me understand what specific aspect of wisdom you're looking for?"
+ERROR_RESPONSE = "I'm experiencing some difficulty accessing my deeper wisdom at this moment. Let me try to help you in a different way - what specific challenge are you facing today?"
+
+# Streamed text is passed straight through until the reply is this close to its
+# max_output_tokens; after that each sentence is held until it is complete
+STREAM_HOLD_BACK_RATIO = 0.75
+
+FALLBACK_RESPONSES = frozenset([
+    PAUSE_RESPONSE,
+    MAX_TOKENS_RESPONSE,
+    SAFETY_RESPONSE,
+    RECITATION_RESPONSE,
+    UNKNOWN_RESPONSE,
+    BLOCKED_RESPONSE,
+    ERROR_RESPONSE,
+])
+
+def finish_reason_response(finish_reason):
+    """Canned reply for a generation that finished without usable text"""
+    if finish_reason == 1:  # STOP (normal completion)
+        return PAUSE_RESPONSE
+    elif finish_reason == 2:  # MAX_TOKENS
+        return MAX_TOKENS_RESPONSE
+    elif finish_reason == 3:  # SAFETY
+        return SAFETY_RESPONSE
+    elif finish_reason == 4:  # RECITATION
+        return RECITATION_RESPONSE
+    else:
+        return UNKNOWN_RESPONSE
+
+def finish_reason_notice(finish_reason):
+    """Notice added after partial text when generation stopped for SAFETY or RECITATION"""
+    return {3: SAFETY_RESPONSE, 4: RECITATION_RESPONSE}.get(finish_reason)
+
+def is_fallback(text):
+    """Whether a reply is canned or ends in a notice; such replies are not cached or kept in sessions"""
+    text = (text or "").strip()
+    return text in FALLBACK_RESPONSES or text.endswith((SAFETY_RESPONSE, RECITATION_RESPONSE))
+
+# HTTP status codes (google.api_core exceptions carry them as .code) worth retrying
+RETRYABLE_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class UpstreamUnavailableError(Exception):
+    """The model could not be reached within the retry budget"""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised without calling the model while the circuit breaker is open"""
+
+
+def is_retryable(e):
+    """Whether an error looks transient (rate limiting, overload, timeouts)"""
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(e, 'code', None)
+    try:
+        return int(code) in RETRYABLE_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Stop calling an unhealthy upstream.
+
+        After failure_threshold consecutive failures the breaker opens and
+        calls fail immediately. Once reset_timeout seconds have passed, one
+        trial call is let through; its outcome closes or reopens the breaker.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # One trial at a time; a trial that never reported back expires
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_started = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ResilientClient:
+    def __init__(self, max_attempts=3, deadline=25.0, base_delay=0.25, max_delay=2.0,
+                 hedge_after=None, breaker=None):
+        """
+        Deadline-aware retries, optional hedging and a circuit breaker around model calls.
+
+        Calls get at most max_attempts tries within deadline seconds, sleeping
+        a jittered exponential backoff between tries. With hedge_after set, a
+        second identical request is started when the first has not answered
+        after that many seconds, and whichever finishes first wins.
+        """
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.retries = 0
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(max_workers=32) if hedge_after else None
+
+    @classmethod
+    def from_env(cls):
+        """Build a client from MENTOR_RETRY_ATTEMPTS, MENTOR_REQUEST_DEADLINE, MENTOR_HEDGE_AFTER and MENTOR_BREAKER_*"""
+        hedge_after = os.getenv('MENTOR_HEDGE_AFTER')
+        return cls(
+            max_attempts=int(os.getenv('MENTOR_RETRY_ATTEMPTS', '3')),
+            deadline=float(os.getenv('MENTOR_REQUEST_DEADLINE', '25')),
+            hedge_after=float(hedge_after) if hedge_after else None,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('MENTOR_BREAKER_THRESHOLD', '5')),
+                reset_timeout=float(os.getenv('MENTOR_BREAKER_RESET', '30')),
+            ),
+        )
+
+    def after_fork(self):
+        # Executor threads do not survive fork
+        if self._executor is not None:
+            self._executor = ThreadPoolExecutor(max_workers=32)
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retrying workers from synchronizing
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn):
+        """Call fn(timeout) with retries; raises UpstreamUnavailableError when it keeps failing"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Model upstream is unavailable (circuit open)")
+
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = self._attempt(fn, remaining)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                last_error = e
+                logger.warning("Retryable model error (attempt %d): %s", attempt + 1, e)
+
+            delay = self._backoff(attempt)
+            if attempt + 1 < self.max_attempts and time.monotonic() + delay < deadline:
+                self.retries += 1
+                time.sleep(delay)
+            else:
+                break
+
+        self.breaker.record_failure()
+        raise UpstreamUnavailableError(f"Model upstream failed: {last_error}") from last_error
+
+    def _attempt(self, fn, timeout):
+        if self._executor is None or timeout <= self.hedge_after:
+            return fn(timeout)
+
+        primary = self._executor.submit(fn, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        secondary = self._executor.submit(fn, timeout - self.hedge_after)
+        last_error = None
+        for future in as_completed([primary, secondary], timeout=timeout - self.hedge_after):
+            try:
+                return future.result()
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def call_async(self, fn):
+        """Async variant of call for a coroutine function fn(timeout)"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Model upstream is unavailable (circuit open)")
+
+        deadline = time.monotonic() + self.deadline
+        last_error = None
+        for attempt in range(self.max_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = await self._attempt_async(fn, remaining)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.record_success()
+                    raise
+                last_error = e
+                logger.warning("Retryable model error (attempt %d): %s", attempt + 1, e)
+
+            delay = self._backoff(attempt)
+            if attempt + 1 < self.max_attempts and time.monotonic() + delay < deadline:
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                break
+
+        self.breaker.record_failure()
+        raise UpstreamUnavailableError(f"Model upstream failed: {last_error}") from last_error
+
+    async def _attempt_async(self, fn, timeout):
+        if not self.hedge_after or timeout <= self.hedge_after:
+            return await asyncio.wait_for(fn(timeout), timeout)
+
+        primary = asyncio.ensure_future(fn(timeout))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        secondary = asyncio.ensure_future(fn(timeout - self.hedge_after))
+        pending = {primary, secondary}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout - self.hedge_after, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError("Hedged model call timed out")
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    last_error = future.exception()
+            raise last_error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+        }
 
 class GeminiResponder:
-    def __init__(self, api_key):
-        """Initialize the Gemini responder with API key"""
-        if not api_key:
-            raise ValueError("API key is required")
-        
-        genai.configure(api_key=api_key)
+    def __init__(self, api_key=None, client=None, model_name="gemini-1.5-flash", dedicated_client=False,
+                 backend=None):
+        """
+        Initialize the Gemini responder with API key.
+
+        The model calls go through `backend` (see backends.py); by default
+        that is the one chosen by MENTOR_BACKEND, the real Gemini API unless
+        it is set to 'fake'. With dedicated_client=True the key is bound to
+        this responder's own gRPC clients instead of the process-wide
+        genai.configure, so several responders can use different keys side
+        by side.
+        """
+        # Retries, hedging and circuit breaking around every model call
+        self.client = client if client is not None else ResilientClient.from_env()
         
         # Configure the model with safety settings to be less restrictive
         self.generation_config = {
@@ -36,41 +341,172 @@ class GeminiResponder:
             },
         ]
         
-        self.model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config=self.generation_config,
-            safety_settings=self.safety_settings
-        )
-    
-    def get_response(self, prompt):
+        self.model_name = model_name
+        if backend is None:
+            backend = build_backend_from_env(
+                api_key, model_name, self.generation_config, self.safety_settings, dedicated_client
+            )
+        self.backend = backend
+
+    def after_fork(self):
+        """Drop connections and threads inherited from the parent process"""
+        self.client.after_fork()
+        if hasattr(self.backend, 'after_fork'):
+            self.backend.after_fork()
+
+    def warm_up(self, system_instructions=(), connect=True, timeout=10.0):
+        """Import, build and connect the backend ahead of the first request"""
+        if not hasattr(self.backend, 'warm_up'):
+            return {}
+        return self.backend.warm_up(system_instructions, connect=connect, timeout=timeout)
+
+    def stats(self):
+        stats = {"model": self.model_name, **self.client.stats()}
+        if hasattr(self.backend, 'stats'):
+            stats["backend"] = self.backend.stats()
+        return stats
+
+    def get_response(self, prompt, system_instruction=None, conversation_type=None, generation_config=None):
         """Get response from Gemini with proper error handling"""
         try:
-            response = self.model.generate_content(prompt)
-            
-            # Check if response was blocked
-            if response.candidates and response.candidates[0].finish_reason != 1:
-                return response.text
-            else:
-                # Handle blocked responses
-                finish_reason = response.candidates[0].finish_reason if response.candidates else "unknown"
-                
-                if finish_reason == 1:  # STOP (normal completion)
-                    return response.text if hasattr(response, 'text') else "I'm reflecting on your words..."
-                elif finish_reason == 2:  # MAX_TOKENS
-                    return response.text if hasattr(response, 'text') else "Let me pause here and continue this thought..."
-                elif finish_reason == 3:  # SAFETY
-                    return "I sense your question touches on sensitive ground. Let me guide you with wisdom while being mindful of our conversation's direction. Could you perhaps share more context about what you're truly seeking?"
-                elif finish_reason == 4:  # RECITATION
-                    return "I notice our conversation may be echoing familiar patterns. Let me offer you fresh perspective and original guidance instead."
+            response = self.client.call(
+                lambda timeout: self.backend.generate(prompt, system_instruction, generation_config, timeout=timeout)
+            )
+            return self._response_text(response, conversation_type)
+        except UpstreamUnavailableError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+
+    async def get_response_async(self, prompt, system_instruction=None, conversation_type=None,
+                                 generation_config=None):
+        """Same as get_response, but awaits the model without blocking the event loop"""
+        try:
+            response = await self.client.call_async(
+                lambda timeout: self.backend.generate_async(prompt, system_instruction, generation_config, timeout=timeout)
+            )
+            return self._response_text(response, conversation_type)
+        except UpstreamUnavailableError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+
+    def get_chat_response(self, history, prompt, system_instruction=None, conversation_type=None,
+                          generation_config=None):
+        """Continue a Gemini chat session built from earlier turns with a new prompt"""
+        try:
+            response = self.client.call(
+                lambda timeout: self.backend.chat(history, prompt, system_instruction, generation_config, timeout=timeout)
+            )
+            return self._response_text(response, conversation_type)
+        except UpstreamUnavailableError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+
+    def stream_response(self, prompt, system_instruction=None, conversation_type=None, generation_config=None):
+        """Yield reply text chunks as Gemini produces them"""
+        if not self.client.breaker.allow():
+            raise CircuitOpenError("Model upstream is unavailable (circuit open)")
+
+        budget = (generation_config if isinstance(generation_config, dict) else {}).get(
+            'max_output_tokens', self.generation_config['max_output_tokens'])
+        hold_back_after = budget * CHARS_PER_TOKEN * STREAM_HOLD_BACK_RATIO
+        emitted = False
+        sent = 0
+        finish_reason = None
+        # Near the budget, text after the last complete sentence is held back
+        # until we know the generation was not cut off in the middle of it
+        pending = ""
+        try:
+            stream = self.backend.generate(
+                prompt, system_instruction, generation_config, timeout=self.client.deadline, stream=True
+            )
+            for chunk in stream:
+                if chunk.candidates:
+                    finish_reason = chunk.candidates[0].finish_reason or finish_reason
+                try:
+                    text = chunk.text
+                except ValueError:
+                    text = ""
+                if not text:
+                    continue
+                pending += text
+                if sent + len(pending) < hold_back_after:
+                    complete, pending = pending, ""
                 else:
-                    return "I'm taking a moment to gather my thoughts. Please share more about what weighs on your mind."
-                    
-        except ValueError as e:
+                    complete, pending = split_at_sentence(pending)
+                if complete:
+                    emitted = True
+                    sent += len(complete)
+                    tail = complete
+                    yield complete
+        except Exception as e:
+            if is_retryable(e):
+                self.client.breaker.record_failure()
+                if not emitted:
+                    raise UpstreamUnavailableError(f"Model upstream failed: {e}") from e
+            if pending:
+                emitted = True
+                yield pending
+            fallback = self._error_response(e)
+            yield f"\n\n{fallback}" if emitted else fallback
+            return
+        self.client.breaker.record_success()
+
+        if finish_reason == 2:  # MAX_TOKENS: drop the cut-off sentence
+            self._budget_exhausted(conversation_type)
+            if not emitted and pending.strip():
+                emitted = True
+                yield trim_to_sentence(pending)
+            elif emitted and split_at_sentence(tail)[1].strip():
+                # Cut off before the hold-back point; end the fragment visibly
+                yield "…"
+        elif pending:
+            emitted = True
+            yield pending
+
+        # The same mapping as _response_text: text is kept, SAFETY and
+        # RECITATION add their notice, and no text at all gets the canned reply
+        if not emitted:
+            yield finish_reason_response(finish_reason)
+        elif finish_reason_notice(finish_reason):
+            yield f"\n\n{finish_reason_notice(finish_reason)}"
+
+    @staticmethod
+    def _budget_exhausted(conversation_type):
+        metrics.increment('mentor_budget_exhausted_total', conversation_type=conversation_type or '')
+
+    def _response_text(self, response, conversation_type=None):
+        """Extract the reply text, mapping incomplete generations to canned replies"""
+        if response.candidates and response.candidates[0].finish_reason == 2:  # MAX_TOKENS
+            # Hit the token budget: keep the complete sentences only
+            self._budget_exhausted(conversation_type)
+            try:
+                text = response.text
+            except ValueError:
+                return MAX_TOKENS_RESPONSE
+            return trim_to_sentence(text) or MAX_TOKENS_RESPONSE
+
+        finish_reason = response.candidates[0].finish_reason if response.candidates else None
+        try:
+            text = response.text
+        except ValueError:
+            # No usable parts, e.g. a STOP with empty content or a blocked prompt
+            text = ""
+        # The same mapping as stream_response
+        if not text.strip():
+            return finish_reason_response(finish_reason)
+        notice = finish_reason_notice(finish_reason)
+        return f"{text}\n\n{notice}" if notice else text
+
+    def _error_response(self, e):
+        """Map a generation error to a canned reply, re-raising unexpected ValueErrors"""
+        if isinstance(e, ValueError):
             if "response.text" in str(e) and "finish_reason" in str(e):
-                return "I understand you're seeking guidance, but I need to approach this topic more carefully. Could you help me understand what specific aspect of wisdom you're looking for?"
+                return BLOCKED_RESPONSE
             else:
                 raise e
-        except Exception as e:
-            # Log the error for debugging
-            print(f"Error in get_response: {e}", file=sys.stderr)
-            return "I'm experiencing some difficulty accessing my deeper wisdom at this moment. Let me try to help you in a different way - what specific challenge are you facing today?"
\ No newline at end of file
+        # Log the error for debugging
+        logger.error("Error in get_response: %s", e)
+        return ERROR_RESPONSE
@@ -0,0 +1,50 @@
+import unicodedata
+
+# Characters the frontend and Windows consoles cannot be relied on to render
+REPLACEMENTS = {
+    '\u014d': 'o',    # ō
+    '\u016b': 'u',    # ū
+    '\u0101': 'a',    # ā
+    '\u012b': 'i',    # ī
+    '\u0113': 'e',    # ē
+    '\u2014': '-',    # em dash
+    '\u2018': "'",    # left single quote
+    '\u2019': "'",    # right single quote
+    '\u201c': '"',    # left double quote
+    '\u201d': '"',    # right double quote
+    '\u2026': '...',  # ellipsis
+}
+
+# Built once per process rather than on every call
+_REPLACEMENT_ITEMS = tuple(REPLACEMENTS.items())
+
+
+def fold_diacritics(text):
+    """Strip accents from any letter by NFKD-decomposing and dropping combining marks"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def clean_unicode_text(text, fold=False):
+    """
+    Clean text to handle Unicode encoding issues.
+
+    Every mapping is a single character, so this is safe to apply to streamed
+    chunks one at a time. With fold=True, accents are removed from all letters
+    rather than only the vowels in REPLACEMENTS.
+
+    Pure-ASCII text (most responses) returns after one C-level scan, and only
+    mappings that occur in the text are applied. str.replace is used over
+    str.translate because CPython's translate with multi-character values
+    goes through a per-character dict lookup and measures far slower; see
+    benchmarks/bench_clean_text.py.
+    """
+    if not text or text.isascii():
+        return text
+
+    for old, new in _REPLACEMENT_ITEMS:
+        if old in text:
+            text = text.replace(old, new)
+    if fold and not text.isascii():
+        text = fold_diacritics(text)
+    return text
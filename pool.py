@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+import time
+
+from model import GeminiResponder, UpstreamUnavailableError
+
+# Conversation types answered by the light tier when one is configured
+LIGHT_CONVERSATION_TYPES = ('greeting', 'farewell')
+
+
+class RateLimitedError(UpstreamUnavailableError):
+    """Every responder that could take the request is out of quota"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """Allow `rate` requests per second on average, with bursts up to capacity"""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` will be available"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self.tokens) / self.rate) if self.rate else float('inf')
+
+
+class PoolMember:
+    def __init__(self, responder, bucket, tier='main', name=None):
+        self.responder = responder
+        self.bucket = bucket
+        self.tier = tier
+        self.name = name or getattr(responder, 'model_name', 'responder')
+        self.in_flight = 0
+        self.requests = 0
+
+    def healthy(self):
+        client = getattr(self.responder, 'client', None)
+        return client is None or client.breaker.state != 'open'
+
+
+class ResponderPool:
+    def __init__(self, members, light_types=LIGHT_CONVERSATION_TYPES, acquire_timeout=2.0):
+        """
+        Spread requests over several responders (API keys and model variants).
+
+        Each member has its own token bucket. A request goes to the least
+        loaded healthy member of its tier that has quota left: the 'light'
+        tier for greetings and farewells when one exists, otherwise 'main'.
+        If every candidate is out of quota, the request waits up to
+        acquire_timeout seconds and then fails with RateLimitedError.
+
+        Members only need the GeminiResponder call methods, so a pool can be
+        built over fake responders for testing.
+        """
+        if not members:
+            raise ValueError("A responder pool needs at least one member")
+        self.members = list(members)
+        self.light_types = tuple(light_types)
+        self.acquire_timeout = acquire_timeout
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_keys):
+        """
+        Build a pool for every key and model in the environment.
+
+        MENTOR_MODELS lists main-tier models (default gemini-1.5-flash) and
+        MENTOR_LIGHT_MODELS the cheaper models for greetings and farewells.
+        MENTOR_KEY_RPM is the per key and model request budget per minute.
+        """
+        models = [m.strip() for m in os.getenv('MENTOR_MODELS', 'gemini-1.5-flash').split(',') if m.strip()]
+        light_models = [m.strip() for m in os.getenv('MENTOR_LIGHT_MODELS', '').split(',') if m.strip()]
+        rate = float(os.getenv('MENTOR_KEY_RPM', '60')) / 60.0
+
+        members = []
+        for index, api_key in enumerate(api_keys):
+            for tier, names in (('main', models), ('light', light_models)):
+                for model_name in names:
+                    responder = GeminiResponder(api_key, model_name=model_name, dedicated_client=True)
+                    members.append(PoolMember(responder, TokenBucket(rate), tier, f"key{index}/{model_name}"))
+        return cls(members, acquire_timeout=float(os.getenv('MENTOR_POOL_ACQUIRE_TIMEOUT', '2')))
+
+    def _candidates(self, conversation_type):
+        tier = 'light' if conversation_type in self.light_types else 'main'
+        members = [m for m in self.members if m.tier == tier] or [m for m in self.members if m.tier == 'main']
+        healthy = [m for m in members if m.healthy()]
+        # If every member's breaker is open, still try; their breakers fail fast
+        return healthy or members
+
+    def _try_acquire(self, candidates):
+        with self._lock:
+            for member in sorted(candidates, key=lambda m: (m.in_flight, -m.bucket.available())):
+                if member.bucket.try_acquire():
+                    member.in_flight += 1
+                    member.requests += 1
+                    return member, 0.0
+            return None, min(m.bucket.wait_time() for m in candidates)
+
+    def _rate_limited(self):
+        with self._lock:
+            self.rate_limited += 1
+        return RateLimitedError("All API keys are rate limited")
+
+    def acquire(self, conversation_type=None):
+        """Reserve the best member for a request, waiting briefly for quota"""
+        candidates = self._candidates(conversation_type)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            member, wait = self._try_acquire(candidates)
+            if member is not None:
+                return member
+            if time.monotonic() + wait > deadline:
+                raise self._rate_limited()
+            time.sleep(wait)
+
+    async def acquire_async(self, conversation_type=None):
+        candidates = self._candidates(conversation_type)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            member, wait = self._try_acquire(candidates)
+            if member is not None:
+                return member
+            if time.monotonic() + wait > deadline:
+                raise self._rate_limited()
+            await asyncio.sleep(wait)
+
+    def release(self, member):
+        with self._lock:
+            member.in_flight -= 1
+
+    def get_response(self, prompt, system_instruction=None, conversation_type=None, generation_config=None):
+        member = self.acquire(conversation_type)
+        try:
+            return member.responder.get_response(
+                prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            )
+        finally:
+            self.release(member)
+
+    async def get_response_async(self, prompt, system_instruction=None, conversation_type=None,
+                                 generation_config=None):
+        member = await self.acquire_async(conversation_type)
+        try:
+            return await member.responder.get_response_async(
+                prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            )
+        finally:
+            self.release(member)
+
+    def get_chat_response(self, history, prompt, system_instruction=None, conversation_type=None,
+                          generation_config=None):
+        member = self.acquire(conversation_type)
+        try:
+            return member.responder.get_chat_response(
+                history, prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            )
+        finally:
+            self.release(member)
+
+    def stream_response(self, prompt, system_instruction=None, conversation_type=None, generation_config=None):
+        member = self.acquire(conversation_type)
+        try:
+            yield from member.responder.stream_response(
+                prompt, system_instruction=system_instruction, conversation_type=conversation_type,
+                generation_config=generation_config,
+            )
+        finally:
+            self.release(member)
+
+    def after_fork(self):
+        for member in self.members:
+            if hasattr(member.responder, 'after_fork'):
+                member.responder.after_fork()
+
+    def warm_up(self, system_instructions=(), connect=True, timeout=10.0):
+        return {
+            member.name: member.responder.warm_up(system_instructions, connect=connect, timeout=timeout)
+            for member in self.members if hasattr(member.responder, 'warm_up')
+        }
+
+    def stats(self):
+        with self._lock:
+            members = [
+                {
+                    "name": m.name,
+                    "tier": m.tier,
+                    "in_flight": m.in_flight,
+                    "requests": m.requests,
+                    "tokens": round(m.bucket.available(), 2),
+                    "healthy": m.healthy(),
+                }
+                for m in self.members
+            ]
+        return {"rate_limited": self.rate_limited, "members": members}
@@ -0,0 +1,32 @@
+import os
+
+# Sent immediately, without a model call, when a question shows self-harm or suicide risk
+CRISIS_RESPONSE = (
+    "I hear how much pain you are carrying right now, and I am truly glad you told me. "
+    "You deserve support from a real person, right now. If you are in immediate danger, "
+    "please call your local emergency number. In the US you can call or text 988 "
+    "(Suicide & Crisis Lifeline); in the UK and Ireland you can call Samaritans on 116 123; "
+    "elsewhere, findahelpline.com lists free, confidential helplines in your country. "
+    "You do not have to face this alone."
+)
+
+# Asked of the mentor for the optional follow-up after CRISIS_RESPONSE
+CRISIS_FOLLOW_UP_TEMPLATE = """{preamble}A student has just written to you: "{question}"
+
+They may be at risk of harming themselves. Crisis helpline details have already been shared with them.
+Respond as {name} in crisis intervention mode: with warmth and without judgement, acknowledge their pain,
+gently encourage them to reach out to a helpline or someone they trust today, and remind them they are not alone.
+Do not give instructions or advice about methods of self-harm. Keep it to at most 4 lines and do not use formatting."""
+
+
+def crisis_response():
+    """The vetted safety reply; MENTOR_CRISIS_RESPONSE replaces it, e.g. with local resources"""
+    return os.getenv('MENTOR_CRISIS_RESPONSE') or CRISIS_RESPONSE
+
+
+def crisis_follow_up_prompt(character, question, include_preamble=True):
+    return CRISIS_FOLLOW_UP_TEMPLATE.format(
+        preamble=character.preamble if include_preamble else "",
+        name=character.name,
+        question=question,
+    )
@@ -0,0 +1,269 @@
+"""
+Approximate response cache for paraphrased questions.
+
+Questions are embedded with a hashing vectorizer (word unigrams and
+bigrams plus character trigrams, so "anxious" and "anxiety" overlap) and
+looked up by cosine similarity in a small per-mentor NumPy matrix.
+
+Cosine similarity over hashed features cannot tell "happy" from "not
+happy" or "father" from "mother". A hit also needs the same negations and
+the same content words (ignoring order, inflection and generic verbs such
+as "deal with"/"handle"), so the cache only bridges rewordings.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency; the semantic cache is disabled without it
+    np = None
+
+from classifier import CRISIS_PATTERNS
+
+logger = logging.getLogger(__name__)
+
+# Questions touching on these never get a cached answer, exact or approximate:
+# the crisis phrases plus abuse and assault
+DEFAULT_EXCLUDE_TERMS = CRISIS_PATTERNS + ['abuse', 'abused', 'abusing', 'assault', 'raped', 'rape']
+
+STOP_WORDS = frozenset("""
+a an and are am as at be been but by can could do does did for from had has have how i i'm im
+in is it its me my of on or so that the this to was what when where which who why will with
+would you your please really just very about feel feeling
+""".split())
+
+# Words that do not change what is being asked; ignored when comparing content words
+GENERIC_WORDS = frozenset("""
+deal dealing handle handling cope coping manage managing tackle face overcome way ways best tip tips
+advice help should shall must might get go going some any thing things more much also
+""".split())
+
+NEGATIONS = frozenset("not no never nothing nobody none nor neither cannot without".split())
+
+_WORD = re.compile(r"[a-z0-9']+")
+_CONTRACTION = re.compile(r"'(?:s|re|ve|ll|d|m)$")
+
+
+class ExclusionList:
+    def __init__(self, terms=DEFAULT_EXCLUDE_TERMS):
+        """Word-boundary match against terms that must always reach the model"""
+        self.terms = list(terms)
+        body = "|".join(r"\s+".join(re.escape(w) for w in t.lower().split()) for t in self.terms)
+        self._regex = re.compile(rf"\b(?:{body})\b") if body else None
+
+    @classmethod
+    def from_env(cls):
+        """The default terms plus any in MENTOR_CACHE_EXCLUDE (comma separated)"""
+        extra = [t.strip() for t in os.getenv('MENTOR_CACHE_EXCLUDE', '').split(',') if t.strip()]
+        return cls(DEFAULT_EXCLUDE_TERMS + extra)
+
+    def matches(self, question):
+        return self._regex is not None and self._regex.search(question.lower()) is not None
+
+
+# Longest first; just enough stripping for plurals, verb forms and anxious/anxiety
+_SUFFIXES = ('ities', 'iety', 'ious', 'ness', 'ity', 'ous', 'ing', 'ies', 'ed', 'es', 'ly', 's', 'e', 'y')
+
+
+def _stem(word):
+    for suffix in _SUFFIXES:
+        if len(word) >= len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def content_key(text):
+    """(negations, stemmed content words) that two questions must share for a hit"""
+    negations = set()
+    content = set()
+    for word in _WORD.findall(text.lower()):
+        word = _CONTRACTION.sub("", word)
+        if word.endswith("n't") or word in NEGATIONS:
+            negations.add("not" if word.endswith("n't") else word)
+        elif word not in STOP_WORDS and word not in GENERIC_WORDS:
+            content.add(_stem(word))
+    return frozenset(negations), frozenset(content)
+
+
+class HashingVectorizer:
+    def __init__(self, dim=2048, char_ngram=3, char_weight=0.5):
+        """Embed text into a fixed-size L2-normalized vector without a vocabulary"""
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.char_weight = char_weight
+
+    def _features(self, text):
+        words = [_CONTRACTION.sub("", w) for w in _WORD.findall(text.lower())]
+        words = [_stem(w) for w in words if w not in STOP_WORDS and w not in GENERIC_WORDS]
+        for word in words:
+            yield "w:" + word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - self.char_ngram + 1):
+                yield "c:" + padded[i:i + self.char_ngram], self.char_weight
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 0.5
+
+    def transform(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            # crc32 is stable across processes, unlike hash()
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    def __init__(self, dim, capacity, initial=16):
+        """Matrix of question vectors with their responses, grown up to capacity rows"""
+        self.capacity = capacity
+        rows = min(initial, capacity)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.responses = [None] * rows
+        self.keys = [None] * rows
+        self.created = np.zeros(rows)
+        self.last_access = np.zeros(rows)
+        self.size = 0
+
+    def _grow(self):
+        rows = min(self.capacity, 2 * len(self.responses))
+        extra = rows - len(self.responses)
+        self.vectors = np.vstack([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.responses.extend([None] * extra)
+        self.keys.extend([None] * extra)
+        self.created = np.concatenate([self.created, np.zeros(extra)])
+        self.last_access = np.concatenate([self.last_access, np.zeros(extra)])
+
+    def search(self, vector):
+        """Return (slot, similarity) of the nearest stored question"""
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def free_slot(self, now, ttl):
+        """A slot for a new entry: unused, else expired, else least recently used"""
+        if self.size == len(self.responses) < self.capacity:
+            self._grow()
+        if self.size < len(self.responses):
+            self.size += 1
+            return self.size - 1, False
+        expired = np.flatnonzero(self.created[:self.size] <= now - ttl)
+        if expired.size:
+            return int(expired[0]), True
+        return int(np.argmin(self.last_access[:self.size])), True
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.8, max_entries=512, ttl=3600, vectorizer=None, exclusions=None):
+        """
+        Serve a cached answer when a new question is close enough to an old one.
+
+        Each (mentor, conversation_type) has its own index of at most
+        max_entries questions. A lookup returns the nearest question's answer
+        if its cosine similarity is at least threshold, it has the same
+        content_key and it is younger than ttl seconds. Questions matching
+        the exclusion list are never looked up or stored.
+        """
+        if np is None:
+            raise RuntimeError("The semantic cache requires numpy")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.exclusions = exclusions if exclusions is not None else ExclusionList()
+        self.hits = 0
+        self.misses = 0
+        self.excluded = 0
+        self.rejected = 0
+        self.evictions = 0
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, question, mentor, conversation_type):
+        """Return (response, similarity) for the nearest fresh question, or (None, similarity)"""
+        if self.exclusions.matches(question):
+            with self._lock:
+                self.excluded += 1
+            return None, 0.0
+        vector = self.vectorizer.transform(question)
+        key = content_key(question)
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get((mentor, conversation_type))
+            slot, similarity = index.search(vector) if index is not None else (None, 0.0)
+            if slot is not None and similarity >= self.threshold and index.created[slot] > now - self.ttl:
+                if index.keys[slot] == key:
+                    index.last_access[slot] = now
+                    self.hits += 1
+                    return index.responses[slot], similarity
+                # Close wording, different question ("happy" / "not happy")
+                self.rejected += 1
+            self.misses += 1
+            return None, similarity
+
+    def set(self, question, mentor, conversation_type, response):
+        if self.exclusions.matches(question):
+            return
+        vector = self.vectorizer.transform(question)
+        key = content_key(question)
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get((mentor, conversation_type))
+            if index is None:
+                index = self._indexes[(mentor, conversation_type)] = SemanticIndex(
+                    self.vectorizer.dim, self.max_entries
+                )
+            slot, similarity = index.search(vector)
+            if slot is None or similarity < 0.999 or index.keys[slot] != key:
+                slot, evicted = index.free_slot(now, self.ttl)
+                self.evictions += evicted
+            index.vectors[slot] = vector
+            index.responses[slot] = response
+            index.keys[slot] = key
+            index.created[slot] = now
+            index.last_access[slot] = now
+
+    def clear(self):
+        with self._lock:
+            self._indexes = {}
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "threshold": self.threshold,
+                "size": sum(index.size for index in self._indexes.values()),
+                "indexes": len(self._indexes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "excluded": self.excluded,
+                "rejected": self.rejected,
+                "evictions": self.evictions,
+            }
+
+
+def build_semantic_cache_from_env():
+    """
+    Build the semantic cache when MENTOR_SEMANTIC_CACHE is on (default off).
+
+    Tuned with MENTOR_SEMANTIC_THRESHOLD, MENTOR_SEMANTIC_SIZE (entries per
+    mentor and conversation type) and MENTOR_SEMANTIC_TTL.
+    """
+    if os.getenv('MENTOR_SEMANTIC_CACHE', 'off').lower() not in ('1', 'on', 'true', 'yes'):
+        return None
+    if np is None:
+        logger.warning("MENTOR_SEMANTIC_CACHE is on but numpy is not installed; semantic cache disabled")
+        return None
+    return SemanticCache(
+        threshold=float(os.getenv('MENTOR_SEMANTIC_THRESHOLD', '0.8')),
+        max_entries=int(os.getenv('MENTOR_SEMANTIC_SIZE', '512')),
+        ttl=float(os.getenv('MENTOR_SEMANTIC_TTL', '3600')),
+        exclusions=ExclusionList.from_env(),
+    )
@@ -0,0 +1,264 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Session ids are signed so clients can only resume sessions this service
+# issued. Set MENTOR_SESSION_SECRET when several processes or replicas share
+# a session store; the random fallback is shared only by the workers of one
+# preloaded gunicorn master.
+SESSION_SECRET = os.getenv('MENTOR_SESSION_SECRET', '').encode('utf-8') or os.urandom(32)
+
+_SESSION_ID = re.compile(r'[0-9a-f]{32}\.[0-9a-f]{32}')
+
+SUMMARY_PROMPT = """Summarize this conversation between a student and their mentor {mentor}.
+Keep what the student shared about themselves, their struggles and goals, and the key advice given.
+Write at most 5 sentences in the third person.
+
+Earlier summary: {summary}
+
+Conversation:
+{transcript}
+"""
+
+
+class MemorySessionBackend:
+    def __init__(self, max_sessions=10000, idle_ttl=1800):
+        """In-process session states; idle sessions expire and the least recently used are evicted"""
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=idle_ttl)
+        self._lock = threading.Lock()
+
+    def load(self, key):
+        with self._lock:
+            state = self._sessions.get(key)
+        return json.loads(state) if state is not None else None
+
+    def save(self, key, state):
+        # Stored serialized so callers never share mutable state
+        with self._lock:
+            self._sessions[key] = json.dumps(state)
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionBackend:
+    def __init__(self, path, max_sessions=10000, idle_ttl=1800):
+        """On-disk session states with the same idle expiry and size bound as the memory backend"""
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+            )
+
+    def after_fork(self):
+        """SQLite connections must not be shared across fork; open a fresh one"""
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def load(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE key = ? AND updated_at > ?",
+                (key, time.time() - self.idle_ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save(self, key, state):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, state, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(state), now),
+            )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (now - self.idle_ttl,))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE key IN ("
+                "SELECT key FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            )
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at > ?", (time.time() - self.idle_ttl,)
+            ).fetchone()[0]
+
+
+class SessionStore:
+    def __init__(self, backend=None, max_turns=12, keep_turns=4, max_turn_chars=2000, summarizer=None):
+        """
+        Bounded per-session conversation history.
+
+        Once a session holds more than max_turns messages, all but the newest
+        keep_turns are folded into a running summary by summarizer(mentor,
+        summary, turns) on a background thread, so the history sent with each
+        question stays roughly constant in size.
+        """
+        self.backend = backend if backend is not None else MemorySessionBackend()
+        self.max_turns = max_turns
+        # Kept turns must start on a student message for the chat history to alternate
+        self.keep_turns = max(2, keep_turns - keep_turns % 2)
+        self.max_turn_chars = max_turn_chars
+        self.summarizer = summarizer
+        self.summaries = 0
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def _signature(token):
+        return hmac.new(SESSION_SECRET, token.encode('ascii'), hashlib.sha256).hexdigest()[:32]
+
+    @classmethod
+    def new_session_id(cls):
+        """A random id with its signature: '<32 hex>.<32 hex>'"""
+        token = uuid.uuid4().hex
+        return f"{token}.{cls._signature(token)}"
+
+    @classmethod
+    def is_valid_session_id(cls, session_id):
+        """Whether session_id was issued by new_session_id with this secret"""
+        if not isinstance(session_id, str) or not _SESSION_ID.fullmatch(session_id):
+            return False
+        token, signature = session_id.split('.')
+        return hmac.compare_digest(signature, cls._signature(token))
+
+    @staticmethod
+    def _key(session_id, mentor):
+        # Each mentor keeps its own thread of conversation within a session
+        return f"{mentor}\x1f{session_id}"
+
+    def get(self, session_id, mentor):
+        """Return the session state: {"summary": str, "turns": [{"role", "text"}, ...]}"""
+        state = self.backend.load(self._key(session_id, mentor))
+        return state if state is not None else {"summary": "", "turns": []}
+
+    def get_chat_history(self, session_id, mentor):
+        """The session as a Gemini chat history list, summary first"""
+        state = self.get(session_id, mentor)
+        history = []
+        if state["summary"]:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far: {state['summary']}"]})
+            history.append({"role": "model", "parts": ["I remember. Let us continue."]})
+        for turn in state["turns"]:
+            history.append({"role": turn["role"], "parts": [turn["text"]]})
+        return history
+
+    def append(self, session_id, mentor, question, answer):
+        """Record one question/answer exchange and compact the session if it grew too long"""
+        key = self._key(session_id, mentor)
+        with self._lock:
+            state = self.backend.load(key) or {"summary": "", "turns": []}
+            state["turns"].append({"role": "user", "text": question[:self.max_turn_chars]})
+            state["turns"].append({"role": "model", "text": answer[:self.max_turn_chars]})
+            if len(state["turns"]) > self.max_turns and self.summarizer is None:
+                # Without a summarizer the oldest turns are simply dropped
+                state["turns"] = state["turns"][-self.keep_turns:]
+            elif len(state["turns"]) > 2 * self.max_turns:
+                # Hard cap in case summarization keeps failing
+                state["turns"] = state["turns"][-self.max_turns:]
+            self.backend.save(key, state)
+
+            compact = (
+                self.summarizer is not None
+                and len(state["turns"]) > self.max_turns
+                and key not in self._compacting
+            )
+            if compact:
+                self._compacting.add(key)
+        if compact:
+            self._executor.submit(self._compact, key, mentor)
+
+    def _compact(self, key, mentor):
+        try:
+            state = self.backend.load(key)
+            if state is None:
+                return
+            old_turns = state["turns"][:-self.keep_turns]
+            summary = self.summarizer(mentor, state["summary"], old_turns)
+
+            with self._lock:
+                # Turns appended while summarizing are kept after the summarized prefix
+                current = self.backend.load(key)
+                if current is None or current["turns"][:len(old_turns)] != old_turns:
+                    return
+                current["summary"] = summary[:self.max_turn_chars]
+                current["turns"] = current["turns"][len(old_turns):]
+                self.backend.save(key, current)
+                self.summaries += 1
+        except Exception as e:
+            # Keep the uncompacted history; the next append will try again
+            logger.warning("Error summarizing session: %s", e)
+        finally:
+            with self._lock:
+                self._compacting.discard(key)
+
+    def delete(self, session_id, mentor):
+        self.backend.delete(self._key(session_id, mentor))
+
+    def after_fork(self):
+        """Replace the compaction thread and backend connection, which do not survive fork"""
+        self._compacting = set()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        if hasattr(self.backend, 'after_fork'):
+            self.backend.after_fork()
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "sessions": len(self.backend),
+            "summaries": self.summaries,
+        }
+
+
+def format_transcript(turns):
+    return "\n".join(
+        f"{'Student' if turn['role'] == 'user' else 'Mentor'}: {turn['text']}" for turn in turns
+    )
+
+
+def build_session_store_from_env(summarizer=None):
+    """Build the session store described by MENTOR_SESSION_* variables"""
+    if not os.getenv('MENTOR_SESSION_SECRET'):
+        logger.warning("MENTOR_SESSION_SECRET is not set; session ids will not survive a restart or work across replicas")
+    max_sessions = int(os.getenv('MENTOR_SESSION_MAX', '10000'))
+    idle_ttl = float(os.getenv('MENTOR_SESSION_IDLE_TTL', '1800'))
+    path = os.getenv('MENTOR_SESSION_PATH')
+    if path:
+        backend = SQLiteSessionBackend(path, max_sessions=max_sessions, idle_ttl=idle_ttl)
+    else:
+        backend = MemorySessionBackend(max_sessions=max_sessions, idle_ttl=idle_ttl)
+    return SessionStore(
+        backend,
+        max_turns=int(os.getenv('MENTOR_SESSION_MAX_TURNS', '12')),
+        keep_turns=int(os.getenv('MENTOR_SESSION_KEEP_TURNS', '4')),
+        summarizer=summarizer,
+    )
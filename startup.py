@@ -0,0 +1,175 @@
+"""
+Warm-up and readiness for a server process.
+
+A process is live as soon as it answers HTTP, and ready once Warmup has
+built the mentors and prompt preambles, imported the model SDK and opened
+its channel to the API. Load balancers should route on readiness, so a new
+replica takes no traffic until its first request can be served at full
+speed.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from metrics import metrics
+from model import is_retryable
+
+logger = logging.getLogger(__name__)
+
+# Status values; ready and degraded both accept traffic
+PENDING, RUNNING, READY, DEGRADED, FAILED = 'pending', 'running', 'ready', 'degraded', 'failed'
+
+
+def _flatten(timings, prefix=""):
+    """{'model': {'connect': 0.3}} -> {'model.connect': 0.3}"""
+    flat = {}
+    for name, value in timings.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{name}."))
+        else:
+            flat[prefix + name] = value
+    return flat
+
+
+class Warmup:
+    def __init__(self, engine, started=None, engine_error=None, timeout=30.0, connect=True):
+        """
+        Bring a process to readiness in the background.
+
+        `started` is a time.perf_counter() taken before the app's imports, so
+        the report includes their cost. Transient upstream errors (timeouts,
+        429 and 5xx) are retried for up to timeout seconds; after that the
+        process reports degraded and takes traffic anyway, since the engine
+        answers with fallbacks while the upstream is down. Any other error,
+        such as a missing SDK or an invalid API key, fails the warm-up and
+        the process never reports ready.
+        """
+        now = time.perf_counter()
+        self.engine = engine
+        self.engine_error = engine_error
+        self.timeout = timeout
+        self.connect = connect
+        self.started = started if started is not None else now
+        self.status = PENDING
+        self.error = None
+        self.attempts = 0
+        self.ready_after = None
+        self.phases = {"app_import": now - self.started}
+        self.preload = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @classmethod
+    def from_env(cls, engine, started=None, engine_error=None):
+        """Configured by MENTOR_WARMUP_TIMEOUT and MENTOR_WARMUP_CONNECT (default on)"""
+        return cls(
+            engine,
+            started=started,
+            engine_error=engine_error,
+            timeout=float(os.getenv('MENTOR_WARMUP_TIMEOUT', '30')),
+            connect=os.getenv('MENTOR_WARMUP_CONNECT', 'on').lower() not in ('0', 'off', 'false', 'no'),
+        )
+
+    @property
+    def ready(self):
+        return self.status in (READY, DEGRADED)
+
+    def start(self):
+        """Run the warm-up in a background thread, once"""
+        with self._lock:
+            if self._thread is not None or self.status != PENDING:
+                return
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def run(self, connect=None):
+        """
+        Warm up in the calling thread.
+
+        run(connect=False) is the part that is safe before a fork: imports,
+        mentors and preambles, but no gRPC channels. It leaves the status
+        pending so the worker still does the full warm-up.
+        """
+        connect = self.connect if connect is None else connect
+        self.status = RUNNING
+        if self.engine is None:
+            self._finish(FAILED, f"Mentor engine unavailable: {self.engine_error}")
+            return
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            self.attempts += 1
+            started = time.perf_counter()
+            try:
+                timings = self.engine.warm_up(connect=connect, timeout=max(1.0, deadline - time.monotonic()))
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                if not is_retryable(e):
+                    self._finish(FAILED, self.error)
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Warm-up gave up after %d attempts, serving degraded: %s",
+                                   self.attempts, self.error)
+                    self._finish(DEGRADED, self.error)
+                    return
+                logger.info("Warm-up attempt %d failed, retrying: %s", self.attempts, self.error)
+                time.sleep(min(remaining, random.uniform(0.5, 2.0) * self.attempts))
+                continue
+            break
+
+        self.error = None
+        self.phases.update(_flatten(timings))
+        self.phases["warm_up"] = time.perf_counter() - started
+        if not connect:
+            self.status = PENDING
+            return
+        self._finish(READY)
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.ready_after = time.perf_counter() - self.started
+        for phase, seconds in self.phases.items():
+            metrics.observe('mentor_startup_seconds', seconds, phase=phase)
+        metrics.observe('mentor_startup_seconds', self.ready_after, phase='ready')
+        if status == FAILED:
+            logger.error("Not ready: %s", error)
+        else:
+            logger.info("%s %.2fs after start: %s", status.capitalize(), self.ready_after,
+                        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items()))
+        self._done.set()
+
+    def after_fork(self):
+        """
+        Start over in a forked worker; its parent's warm-up thread and
+        channels did not come along. The parent's timings stay in the report
+        under 'preload'.
+        """
+        self.preload = {"phases": self.phases, "attempts": self.attempts}
+        self.status = PENDING
+        self.error = None
+        self.attempts = 0
+        self.ready_after = None
+        self.phases = {}
+        self.started = time.perf_counter()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def stats(self):
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "ready_after": self.ready_after,
+            "attempts": self.attempts,
+            "error": self.error,
+            "phases": dict(self.phases),
+            "preload": self.preload,
+        }